@@ -1,19 +1,31 @@
 import sys
-from smbusslave import SMBusSlave
+from smbusslave import SMBusSlave, Register, RegisterMap
+
+CONVERSION = 0x00
+CONFIG = 0x01
+LO_THRESH = 0x02
+HI_THRESH = 0x03
+
 
 class ADS1015Slave(SMBusSlave):
+    __slots__ = ('regmap', 'regs', 'adcs', 'index')
+
     def __init__(self, adcs):
         if len(adcs) == 0:
             raise ValueError('adcs is empty')
         super().__init__()
         self.protocol = SMBusSlave.SMBUS_WORD_SEQ
         self.max_reg = 3
-        self.config = 0x8583
-        self.lo_thresh = 0x8000;
-        self.hi_thresh = 0x7fff;
+        self.regmap = RegisterMap(self.max_reg + 1, {
+            CONVERSION: Register(readonly=True, read=self._read_conversion),
+            CONFIG: Register(0x8583, write=self._write_config),
+            # The 4 LSBs of the threshold registers are fixed (12-bit device)
+            LO_THRESH: Register(0x8000, wmask=0xfff0),
+            HI_THRESH: Register(0x7fff, wmask=0xfff0),
+        }, width=16)
+        self.regs = self.regmap.regs
         self.adcs = adcs
         self.index = 0
-        self.debug = False
 
     def value(self):
         if self.index < len(self.adcs):
@@ -21,45 +33,25 @@ class ADS1015Slave(SMBusSlave):
         return 0
 
     def readreg(self, reg):
-        if reg == 0x00:
-            # ADS101x: 12 bits of data in binary two's complement format that is left justified within the 16-bit data word.
-            # analogio.AnalogIn: 16-bit regardless of the underlying hw
-            val = self.value() >> 1  # Make it a signed value
-        elif reg == 0x01:
-            val = self.config
-        elif reg == 0x02:
-            val = self.lo_thresh
-        elif reg == 0x03:
-            val = self.hi_thresh
-        else:
-            val = 0xdead
-
-        if self.debug:
-            print(" 0x%02x==0x%02x" % (reg, val))
-
+        val = self.regmap.read(reg)
         # doesn't follow smbus standard (little endian), so swap bytes
-        return (val >> 8) | (val << 8)
+        return ((val >> 8) | (val << 8)) & 0xffff
 
     def writereg(self, reg, val):
         # doesn't follow smbus standard (little endian), so swap bytes
-        val = (val >> 8) | (val << 8);
-
-        if self.debug:
-            print(" 0x%02x=0x%02x" % (reg, val))
-
-        if reg == 0x01:
-            mux = (val >> 12) & 0b111
-            if mux & 0b100:
-                self.index = mux & 0b011
-            else:
-                # Differential, not supported
-                self.index = 0
-            if self.debug:
-                print("   index=%d" % (self.index,))
-            self.config = val;
-
-        elif reg == 0x02:
-            self.lo_thresh = val & 0b0000
-
-        elif reg == 0x03:
-            self.hi_thresh = val | 0b1111
+        val = ((val >> 8) | (val << 8)) & 0xffff
+        self.regmap.write(reg, val)
+
+    def _read_conversion(self, reg):
+        # ADS101x: 12 bits of data in binary two's complement format that is left justified within the 16-bit data word.
+        # analogio.AnalogIn: 16-bit regardless of the underlying hw
+        return self.value() >> 1  # Make it a signed value
+
+    def _write_config(self, reg, val):
+        mux = (val >> 12) & 0b111
+        if mux & 0b100:
+            self.index = mux & 0b011
+        else:
+            # Differential, not supported
+            self.index = 0
+        self.regs[CONFIG] = val
@@ -1,55 +1,331 @@
 
+import tracer
+from ticks import ticks_us, ticks_diff
+
+
+# True when ms milliseconds have passed since the ticks_us() value start.
+# A negative difference means it's been more than half a ticks period.
+def _expired(start, ms):
+    diff = ticks_diff(ticks_us(), start)
+    return diff < 0 or diff >= ms * 1000
+
+
+class Geometry:
+    __slots__ = ('size', 'page_size', 'addr_bytes')
+
+    def __init__(self, size, page_size, addr_bytes):
+        self.size = size
+        self.page_size = page_size
+        self.addr_bytes = addr_bytes  # Number of memory address bytes
+
+
+# The 24C04/08/16 use the low bits of the I2C address as the high memory
+# address bits, the device has to be added at 2, 4 or 8 consecutive addresses.
+AT24C01 = Geometry(128, 8, 1)
+AT24C02 = Geometry(256, 8, 1)
+AT24C04 = Geometry(512, 16, 1)
+AT24C08 = Geometry(1024, 16, 1)
+AT24C16 = Geometry(2048, 16, 1)
+AT24C32 = Geometry(4096, 32, 2)
+AT24C64 = Geometry(8192, 32, 2)
+AT24C128 = Geometry(16384, 64, 2)
+AT24C256 = Geometry(32768, 64, 2)
+AT24C512 = Geometry(65536, 128, 2)
+
+FAMILY = (AT24C01, AT24C02, AT24C04, AT24C08, AT24C16, AT24C32, AT24C64, AT24C128, AT24C256, AT24C512)
+
+
+# file is a file like object or a bytearray holding the EEPROM contents.
+# A bytearray is served straight from memory which is a lot faster.
+# The geometry defaults to the smallest part that holds the contents.
+#
+# cache=True reads the file into memory and writes it back later, pages
+# written by the master are flushed by idle() or sync(). The whole image is
+# kept in RAM, size bytes plus a bit per page, so a 4 KB or larger image won't
+# fit on the boards with a small heap like the M0 boards:
+#
+#   at24 = AT24Slave(open('/eeprom.bin', 'r+b'), cache=True)
+#   scheduler.add(at24.idle)
+#
+# Setting write_cycle emulates the internal write cycle of the real parts: the
+# device is busy for write_cycle ms after a write and NACKs the master, which
+# polls until it gets an ACK. The page is stored by idle() once the write
+# cycle is over and the device stays busy until then, so this needs idle() to
+# run as a background task. Without one leave write_cycle at None, the page is
+# then stored when the master is done writing.
+# I2CSlave has already ACKed the I2C address, so it's the memory address that
+# gets NACKed, which the master sees as the same error.
 class AT24Slave:
-    def __init__(self, file):
-        file.seek(0, 2)
-        size = file.tell()
-        file.seek(0, 0)
+    __slots__ = ('file', 'mem', 'size', 'geometry', 'addr', 'tracer', '_blockmask', '_page',
+                 '_read', '_load', '_store',
+                 'flush_delay', 'max_age', 'flush_pages', 'dirty_pages', '_dirty', '_first_dirty', '_last_write',
+                 'write_cycle', 'busy_nacks', '_pending', '_pending_addr', '_write_start')
+
+    def __init__(self, file, geometry=None, cache=False):
+        if cache and not isinstance(file, bytearray):
+            file.seek(0)
+            self.file = file
+            self.mem = memoryview(bytearray(file.read()))
+            size = len(self.mem)
+            self._read = self._read_mem
+            self._load = self._load_mem
+            self._store = self._store_cached
+        elif isinstance(file, bytearray):
+            self.file = None
+            self.mem = memoryview(file)
+            size = len(file)
+            self._read = self._read_mem
+            self._load = self._load_mem
+            self._store = self._store_mem
+        else:
+            file.seek(0, 2)
+            size = file.tell()
+            file.seek(0, 0)
+            self.file = file
+            self.mem = None
+            self._read = self._read_file
+            self._load = self._load_file
+            self._store = self._store_file
         if size == 0:
             raise ValueError('File is empty')
-        self.file = file
+        if geometry is None:
+            for geometry in FAMILY:
+                if size <= geometry.size:
+                    break
+        if size > geometry.size:
+            raise ValueError('File is bigger than the EEPROM')
         self.size = size
+        self.geometry = geometry
         self.addr = 0
-        self.debug = False
+        self.tracer = None  # tracer.Tracer
+        if geometry.addr_bytes == 1:
+            self._blockmask = (geometry.size >> 8) - 1 if geometry.size > 256 else 0
+        else:
+            self._blockmask = 0
+        self._page = None  # Allocated on the first write
+        # Write-back cache
+        self.flush_delay = 500  # Milliseconds without page writes before idle() flushes
+        self.max_age = 5000  # Milliseconds a page can stay dirty while the master keeps writing
+        self.flush_pages = 1  # Pages idle() writes per call, keeps the scheduler slice short
+        self.dirty_pages = 0
+        self._dirty = None
+        if cache:
+            num_pages = (size + geometry.page_size - 1) // geometry.page_size
+            self._dirty = bytearray((num_pages + 7) // 8)  # Bitmap
+        self._first_dirty = 0
+        self._last_write = 0
+        # Write cycle
+        self.write_cycle = None  # Milliseconds, None stores the page right away
+        self.busy_nacks = 0
+        self._pending = None  # Page waiting to be stored
+        self._pending_addr = 0
+        self._write_start = 0
 
-    def process(self, req):
-        if not req.is_read:
+    @property
+    def busy(self):
+        return self._pending is not None
+
+    # Store the pending page if the write cycle is over
+    def _finish_write(self):
+        if _expired(self._write_start, self.write_cycle):
+            self._store(self._pending_addr, self._pending)
+            self._pending = None
+
+    # Receive the memory address, NACK it if it's out of range
+    def _recv_addr(self, req):
+        if self.geometry.addr_bytes == 2:
             byte = req.read(1, ack=False)
-            if self.debug:
-                print("process write: ", byte)
             if not byte:
-                return
-            addr = byte[0]
-            if addr > 128:
-                req.ack(False)
-                return
-
+                return None
             req.ack(True)
-            self.addr = addr
+            addr = byte[0] << 8
+        else:
+            addr = (req.address & self._blockmask) << 8
+        byte = req.read(1, ack=False)
+        if not byte:
+            return None
+        addr |= byte[0]
+        if self.tracer:
+            self.tracer.record(tracer.PROCESS_WRITE, addr)
+        if addr >= self.size:
+            req.ack(False)
+            if self.tracer:
+                self.tracer.record(tracer.NACK, addr)
+            return None
+        req.ack(True)
+        return addr
 
-            if self.debug:
-                print("self.addr =", self.addr)
+    def process(self, req):
+        if self._pending is not None:
+            self.busy_nacks += 1
+            if self.tracer:
+                self.tracer.record(tracer.NACK, self.addr)
+            if not req.is_read:
+                if req.read(1, ack=False):
+                    req.ack(False)
+            return
 
-            data = req.read(16)
-            if not data:
+        if not req.is_read:
+            addr = self._recv_addr(req)
+            if addr is None:
                 return
-            self.file.seek(self.addr)
-            self.file.write(data)
-
+            self.addr = addr
+            self._write_page(req, addr)
             return
 
         elif req.is_restart:
-            if self.debug:
-                print("process restart: ")
-
-            self.file.seek(self.addr)
+            if self.tracer:
+                self.tracer.record(tracer.PROCESS_RESTART_READ, self.addr)
 
         else:  # Read
-            if self.debug:
-                print("process read: ")
+            if self.tracer:
+                self.tracer.record(tracer.PROCESS_READ, self.addr)
+
+        self._read(req)
 
+    # Page sized chunks, wrapping around at the end of the file
+    def _read_file(self, req):
+        file = self.file
+        addr = self.addr
+        file.seek(addr)
         while True:
-            byte = self.file.read(1)
-            if not byte:
-                return
-            if req.write(byte) != 1:
-                return
+            chunk = file.read(min(self.geometry.page_size, self.size - addr))
+            n = req.write(chunk)
+            addr += n
+            if addr == self.size:
+                addr = 0
+                file.seek(0)
+            if n < len(chunk) or not chunk:
+                break
+        self.addr = addr
+
+    # Like the real thing the data rolls over to the start of the page when it
+    # reaches the end. The page is stored in one go when the master is done.
+    def _write_page(self, req, addr):
+        ps = self.geometry.page_size
+        if self._page is None:
+            self._page = memoryview(bytearray(ps))
+        start = addr - addr % ps
+        page = self._page[:min(ps, self.size - start)]
+        plen = len(page)
+        pos = addr - start
+        total = 0
+        loaded = False
+        while True:
+            data = req.read(ps)
+            n = len(data)
+            if not n:
+                break
+            if not loaded:
+                self._load(start, page)
+                loaded = True
+            total += n
+            if n >= plen:
+                # Only the last page full survives
+                pos = (pos + n - plen) % plen
+                data = data[n - plen:]
+                n = plen
+            first = min(n, plen - pos)
+            page[pos:pos + first] = data[:first]
+            if first < n:
+                page[:n - first] = data[first:]
+            pos = (pos + n) % plen
+        if not total:
+            return
+        if self.tracer:
+            self.tracer.record(tracer.WRITE, addr, total)
+        self.addr = start + pos
+        if self.write_cycle is None:
+            self._store(start, page)
+        else:
+            self._pending = page
+            self._pending_addr = start
+            self._write_start = ticks_us()
+
+    def _load_file(self, addr, buf):
+        self.file.seek(addr)
+        buf[:] = self.file.read(len(buf))
+
+    def _store_file(self, addr, buf):
+        self.file.seek(addr)
+        self.file.write(buf)
+
+    # Hand the master everything up to the end of memory and wrap around if it wants more
+    def _read_mem(self, req):
+        mem = self.mem
+        addr = self.addr
+        while True:
+            chunk = mem[addr:]
+            n = req.write(chunk)
+            addr += n
+            if addr == self.size:
+                addr = 0
+            if n < len(chunk):
+                break
+        self.addr = addr
+
+    # Store the page in memory and mark it dirty, repeated writes to a page cost one flush
+    def _store_cached(self, addr, buf):
+        self.mem[addr:addr + len(buf)] = buf
+        page = addr // self.geometry.page_size
+        mask = 1 << (page & 7)
+        now = ticks_us()
+        if not self._dirty[page >> 3] & mask:
+            self._dirty[page >> 3] |= mask
+            if not self.dirty_pages:
+                self._first_dirty = now
+            self.dirty_pages += 1
+        self._last_write = now
+
+    # Write dirty pages back to the file, consecutive pages in one write.
+    # Returns the number of pages written.
+    def flush(self, max_pages=None):
+        if not self.dirty_pages:
+            return 0
+        dirty = self._dirty
+        ps = self.geometry.page_size
+        num_pages = (self.size + ps - 1) // ps
+        written = 0
+        page = 0
+        while page < num_pages and self.dirty_pages:
+            if max_pages is not None and written >= max_pages:
+                break
+            if not dirty[page >> 3] & (1 << (page & 7)):
+                page += 1
+                continue
+            first = page
+            while page < num_pages and dirty[page >> 3] & (1 << (page & 7)):
+                if max_pages is not None and written >= max_pages:
+                    break
+                dirty[page >> 3] &= ~(1 << (page & 7))
+                self.dirty_pages -= 1
+                written += 1
+                page += 1
+            self.file.seek(first * ps)
+            self.file.write(self.mem[first * ps:min(page * ps, self.size)])
+        return written
+
+    # Background task: flush_pages pages are written per call once no page has
+    # been written for flush_delay ms or a page has been dirty for max_age ms.
+    # The pending page is stored first when the write cycle is over.
+    def idle(self):
+        if self._pending is not None:
+            self._finish_write()
+        if not self.dirty_pages:
+            return
+        if _expired(self._last_write, self.flush_delay) or _expired(self._first_dirty, self.max_age):
+            self.flush(self.flush_pages)
+
+    def sync(self):
+        if self._pending is not None:
+            self._store(self._pending_addr, self._pending)
+            self._pending = None
+        self.flush()
+        if self.file is not None and hasattr(self.file, 'flush'):
+            self.file.flush()
+
+    def _load_mem(self, addr, buf):
+        buf[:] = self.mem[addr:addr + len(buf)]
+
+    def _store_mem(self, addr, buf):
+        self.mem[addr:addr + len(buf)] = buf
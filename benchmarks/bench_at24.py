@@ -0,0 +1,34 @@
+# AT24Slave read throughput: file backed page sized chunks vs bytearray backed slices
+#
+# Runs under CPython from the repo root (python benchmarks/bench_at24.py [num])
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from i2cslavemock import I2CSlave, I2CMaster
+from at24slave import AT24Slave
+
+
+def bench(at24, size, num):
+    bus = I2CMaster(I2CSlave(None, None, (0x50,)), at24.process)
+    start = time.perf_counter()
+    for _ in range(num):
+        bus.write_read(0x50, [0], size)
+    elapsed = time.perf_counter() - start
+    return num * size / elapsed
+
+
+def main(num=200):
+    image = bytes(range(256))
+    for size in (16, 128, 256):
+        slow = bench(AT24Slave(io.BytesIO(image)), size, num)
+        fast = bench(AT24Slave(bytearray(image)), size, num)
+        print('%3d byte read: file %8.0f bytes/s, bytearray %8.0f bytes/s, x%.1f' % (size, slow, fast, fast / slow))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
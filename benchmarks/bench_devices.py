@@ -0,0 +1,142 @@
+# Throughput of each device model and protocol, no hardware needed
+#
+# Runs under CPython from the repo root:
+#
+#   python benchmarks/bench_devices.py [--json] [num]
+#
+# The transactions are driven through i2cslavemock so the numbers include
+# the mock overhead, it's measured separately as the 'mock' case with a
+# handler that does nothing. --json prints one JSON object per case for
+# regression tracking, compare runs from the same machine only.
+
+import io
+import json
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import i2cslavemock
+i2cslavemock.install()
+
+from i2cslavemock import I2CSlave, I2CMaster
+from smbusslave import SMBusSlave
+from at24slave import AT24Slave
+from ds1307slave import DS1307Slave
+from ads1015slave import ADS1015Slave, CONVERSION
+from mcp23008slave import MCP23008Slave, GPIO
+import rtc
+
+
+class Slave(SMBusSlave):
+    def __init__(self, protocol):
+        super().__init__()
+        self.protocol = protocol
+        self.max_reg = 7
+        self.regs = array('H', range(self.max_reg + 1))
+
+    def readreg(self, reg):
+        return self.regs[reg]
+
+    def writereg(self, reg, val):
+        self.regs[reg] = val
+
+
+class AnalogIn:
+    value = 0x8000
+
+
+def master(address, handler):
+    return I2CMaster(I2CSlave(None, None, (address,)), handler)
+
+
+# Each case returns (transaction function, bytes moved per transaction excluding addresses)
+
+def case_mock():
+    bus = master(0x41, lambda req: None)
+    return lambda: bus.write(0x41, [0]), 1
+
+
+def case_smbus(protocol, is_read, count):
+    width = 2 if protocol in (SMBusSlave.SMBUS_WORD, SMBusSlave.SMBUS_WORD_SEQ) else 1
+    bus = master(0x41, Slave(protocol).process)
+    n = width * count
+    if is_read:
+        return lambda: bus.write_read(0x41, [1], n), 1 + n
+    data = [1] + [0x55] * n
+    return lambda: bus.write(0x41, data), 1 + n
+
+
+def case_at24():
+    at24 = AT24Slave(io.BytesIO(bytes(range(128))))
+    bus = master(0x50, at24.process)
+    return lambda: bus.write_read(0x50, [0], 128), 1 + 128
+
+
+def case_ds1307():
+    ds1307 = DS1307Slave(rtc.RTC(), io.BytesIO(bytes(56)))
+    bus = master(0x68, ds1307.process)
+    return lambda: bus.write_read(0x68, [0], 64), 1 + 64
+
+
+def case_ads1015():
+    ads1015 = ADS1015Slave([AnalogIn()])
+    bus = master(0x48, ads1015.process)
+    return lambda: bus.read_word_data(0x48, CONVERSION), 1 + 2
+
+
+def case_mcp23008():
+    mcp23008 = MCP23008Slave(['D%d' % (i,) for i in range(8)])
+    bus = master(0x20, mcp23008.process)
+    return lambda: bus.read_byte_data(0x20, GPIO), 1 + 1
+
+
+CASES = [('mock', case_mock)]
+for _name, _protocol, _count in (('BYTE', SMBusSlave.SMBUS_BYTE, 1),
+                                 ('BYTE_SEQ', SMBusSlave.SMBUS_BYTE_SEQ, 8),
+                                 ('WORD', SMBusSlave.SMBUS_WORD, 1),
+                                 ('WORD_SEQ', SMBusSlave.SMBUS_WORD_SEQ, 8)):
+    for _is_read in (False, True):
+        CASES.append(('%s %s' % (_name, 'read' if _is_read else 'write'),
+                      (lambda p=_protocol, r=_is_read, c=_count: case_smbus(p, r, c))))
+CASES += [
+    ('AT24 128 byte image read', case_at24),
+    ('DS1307 64 register dump', case_ds1307),
+    ('ADS1015 conversion read', case_ads1015),
+    ('MCP23008 GPIO poll', case_mcp23008),
+]
+
+
+def bench(func, nbytes, num):
+    func()  # Warm up, lazily allocated buffers
+    start = time.perf_counter()
+    for _ in range(num):
+        func()
+    elapsed = time.perf_counter() - start
+    return {
+        'tps': num / elapsed,
+        'us_per_transaction': elapsed * 1000000 / num,
+        'us_per_byte': elapsed * 1000000 / (num * nbytes),
+        'bytes': nbytes,
+        'num': num,
+    }
+
+
+def main(argv):
+    as_json = '--json' in argv
+    args = [arg for arg in argv if arg != '--json']
+    num = int(args[0]) if args else 2000
+    for name, case in CASES:
+        func, nbytes = case()
+        result = bench(func, nbytes, num)
+        if as_json:
+            result['case'] = name
+            print(json.dumps(result, sort_keys=True))
+        else:
+            print('%-25s: %8.0f transactions/s, %7.2f us/byte' % (name, result['tps'], result['us_per_byte']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,107 @@
+# Per byte cost of SMBus PEC
+#
+# Runs under CPython from the repo root (python benchmarks/bench_pec.py)
+# or on a board with smbusslave.py in CIRCUITPY.
+
+import sys
+import time
+
+try:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except (ImportError, AttributeError):  # CircuitPython has no os.path
+    pass
+
+from smbusslave import SMBusSlave, crc8
+
+
+class Request:
+    def __init__(self, data):
+        self.address = 0x41
+        self.is_read = False
+        self.is_restart = False
+        self.data = data
+        self.pos = 0
+
+    def read(self, n=-1, ack=True):
+        pos = self.pos
+        self.pos += n
+        return self.data[pos:self.pos]
+
+    def write(self, buf):
+        return len(buf)
+
+    def ack(self, ack=True):
+        pass
+
+
+class Slave(SMBusSlave):
+    def __init__(self, protocol, pec):
+        super().__init__()
+        self.protocol = protocol
+        self.max_reg = 7
+        self.regs = [0] * (self.max_reg + 1)
+        self.block = bytes(range(SMBusSlave.BLOCK_MAX))
+        self.pec = pec
+
+    def readreg(self, reg):
+        return self.regs[reg]
+
+    def writereg(self, reg, val):
+        self.regs[reg] = val
+
+    def readblock(self, reg):
+        return self.block
+
+    def writeblock(self, reg, buf):
+        pass
+
+
+def bench(protocol, pec, num, is_read):
+    slave = Slave(protocol, pec)
+    payload = {
+        SMBusSlave.SMBUS_BYTE: 1,
+        SMBusSlave.SMBUS_WORD: 2,
+        SMBusSlave.SMBUS_BLOCK: 1 + SMBusSlave.BLOCK_MAX,
+    }[protocol]
+    if protocol == SMBusSlave.SMBUS_BLOCK:
+        data = bytes([1, SMBusSlave.BLOCK_MAX]) + slave.block
+    else:
+        data = bytes([1]) + bytes(payload)
+    if pec:
+        data += bytes([crc8(crc8(0, bytes([0x41 << 1])), data)])
+    reqs = [Request(data) for _ in range(num)]
+    if is_read:
+        for req in reqs:
+            slave.process(req)
+            req.is_read = True
+            req.is_restart = True
+
+    start = time.monotonic()
+    for req in reqs:
+        req.pos = 0
+        slave.process(req)
+    elapsed = time.monotonic() - start
+    return elapsed * 1000000 / num / payload
+
+
+def main(num=1000):
+    buf = bytes(256)
+    start = time.monotonic()
+    for _ in range(num // 100 or 1):
+        crc8(0, buf)
+    elapsed = time.monotonic() - start
+    print('crc8: %.3f us/byte' % (elapsed * 1000000 / ((num // 100 or 1) * len(buf)),))
+
+    for name, protocol in (('BYTE', SMBusSlave.SMBUS_BYTE),
+                           ('WORD', SMBusSlave.SMBUS_WORD),
+                           ('BLOCK', SMBusSlave.SMBUS_BLOCK)):
+        for is_read in (False, True):
+            off = bench(protocol, False, num, is_read)
+            on = bench(protocol, True, num, is_read)
+            print('%-5s %-5s: PEC off %.3f us/byte, PEC on %.3f us/byte, +%.3f us/byte' %
+                  (name, 'read' if is_read else 'write', off, on, on - off))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Worst case request pickup latency with N background tasks
+#
+# Runs under CPython from the repo root (python benchmarks/bench_scheduler.py)
+# or on a board with scheduler.py and ticks.py in CIRCUITPY.
+
+import sys
+
+try:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except (ImportError, AttributeError):  # CircuitPython has no os.path
+    pass
+
+from scheduler import Scheduler
+from ticks import monotonic_ns
+
+
+class Request:
+    address = 0x20
+    is_read = False
+    is_restart = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        pass
+
+
+# Makes a request pending every interval_ns and records how long it took to pick it up
+class Router:
+    def __init__(self, interval_ns):
+        self.interval_ns = interval_ns
+        self.pending = monotonic_ns() + interval_ns
+        self.latencies = []
+
+    def poll(self, timeout=-1):
+        now = monotonic_ns()
+        if now < self.pending:
+            return False
+        self.latencies.append(now - self.pending)
+        self.pending = now + self.interval_ns
+        return True
+
+
+def sampler(work):
+    while True:
+        for _ in range(work):
+            pass
+        yield
+
+
+def checker(work):
+    def check():
+        for _ in range(work):
+            pass
+    return check
+
+
+def bench(num_tasks, work, num_requests=200, interval_us=500):
+    router = Router(interval_us * 1000)
+    scheduler = Scheduler(router)
+    for i in range(num_tasks):
+        if i % 2:
+            scheduler.add(sampler(work))
+        else:
+            scheduler.add(checker(work))
+    while len(router.latencies) < num_requests:
+        scheduler.step()
+    latencies = router.latencies
+    return max(latencies) / 1000, sum(latencies) / len(latencies) / 1000, scheduler.max_slice_ns / 1000
+
+
+def main():
+    work = 100
+    for num_tasks in (0, 1, 4, 16):
+        worst, mean, slice_us = bench(num_tasks, work)
+        print('tasks=%-2d work=%d: pickup worst %.1f us, mean %.1f us, longest slice %.1f us' %
+              (num_tasks, work, worst, mean, slice_us))
+
+
+if __name__ == '__main__':
+    main()
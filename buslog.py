@@ -0,0 +1,277 @@
+# Record the bus traffic a device sees and replay it into a device model
+#
+#   with open('/bus.log', 'wb') as f:
+#       recorder = Recorder(mcp23008, f)
+#       router.add(0x20, recorder)
+#       scheduler.add(recorder.flush)
+#       scheduler.run()
+#
+#   # Later, under CPython
+#   with open('bus.log', 'rb') as f:
+#       replayer = Replayer(f)
+#       replayer.run(MCP23008Slave(pins).process)
+#       print(replayer.mismatches)
+#
+# The log starts with HEADER followed by one record per request:
+#   uint32 start time (us since the previous record started), uint32 duration (us),
+#   uint8 address, uint8 flags, uint16 length, then length bytes of data.
+# All little endian. The data is what the device read from the master or
+# what the master read from the device.
+# The times are ticks_us() differences so they stay small ints on the board,
+# a gap longer than half a ticks period is recorded as 0. records() adds up
+# the start times so Record.time is the time since the recording started.
+
+import struct
+from ticks import ticks_us, ticks_diff
+
+HEADER = b'I2CLOG\x02\x00'  # Magic, version, reserved
+
+RECORD = '<IIBBH'
+RECORD_SIZE = struct.calcsize(RECORD)
+
+# Record flags
+FLAG_READ = 1 << 0
+FLAG_RESTART = 1 << 1
+FLAG_NACK = 1 << 2  # The device NACKed the last byte
+
+
+# Stands in for the request and hands the data transferred to the Recorder
+class _RecordedRequest:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.req = None
+        self.address = 0
+        self.is_read = False
+        self.is_restart = False
+        self.nack = False
+        self._readinto = False
+
+    def start(self, req):
+        self.req = req
+        self.address = req.address
+        self.is_read = req.is_read
+        self.is_restart = req.is_restart
+        self.nack = False
+        self._readinto = hasattr(type(req), 'readinto')
+
+    def read(self, n=-1, ack=True):
+        data = self.req.read(n, ack=ack)
+        self.recorder._append(data, len(data))
+        return data
+
+    # Always there so the device keeps its readinto() path
+    def readinto(self, buf, ack=True):
+        if self._readinto:
+            n = self.req.readinto(buf, ack=ack)
+        else:
+            data = self.req.read(len(buf), ack=ack)
+            n = len(data)
+            if n:
+                buf[:n] = data
+        self.recorder._append(buf, n)
+        return n
+
+    def ack(self, ack=True):
+        self.req.ack(ack)
+        if not ack:
+            self.nack = True
+
+    def write(self, buf):
+        n = self.req.write(buf)
+        self.recorder._append(buf, n)
+        return n
+
+
+# The records are kept in a RAM ring buffer of size bytes so the transaction
+# isn't held up by the file, flush() writes them out from a background task.
+# A record that doesn't fit in the buffer is dropped and counted.
+class Recorder:
+    def __init__(self, device, file, size=4096):
+        self.device = device
+        self.file = file
+        self.records = 0
+        self.dropped = 0
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._head = 0  # Next byte to record
+        self._used = 0  # Bytes waiting for flush()
+        self._record = 0  # Start of the record being recorded
+        self._length = 0
+        self._overflow = False
+        self._header = bytearray(RECORD_SIZE)
+        self._req = _RecordedRequest(self)
+        self._last = ticks_us()  # Start of the previous record
+        file.write(HEADER)
+
+    # Copy n bytes of data into the ring at pos
+    def _copy(self, pos, data, n):
+        size = len(self._buf)
+        first = n if n < size - pos else size - pos
+        self._view[pos:pos + first] = data[:first]
+        if first < n:
+            self._view[:n - first] = data[first:n]
+
+    def _reserve(self, n):
+        if self._overflow or self._used + n > len(self._buf):
+            self._overflow = True
+            return False
+        self._head = (self._head + n) % len(self._buf)
+        self._used += n
+        return True
+
+    def _append(self, data, n):
+        if not n:
+            return
+        pos = self._head
+        if self._reserve(n):
+            self._copy(pos, data, n)
+            self._length += n
+
+    def process(self, req):
+        t0 = ticks_us()
+        recorded = self._req
+        recorded.start(req)
+        used = self._used
+        self._record = self._head
+        self._length = 0
+        self._overflow = False
+        self._reserve(RECORD_SIZE)  # The header is filled in when the request is done
+        try:
+            return self.device.process(recorded)
+        finally:
+            t1 = ticks_us()
+            recorded.req = None
+            if self._overflow:
+                # Drop the partial record
+                self._head = self._record
+                self._used = used
+                self.dropped += 1
+            else:
+                flags = 0
+                if recorded.is_read:
+                    flags |= FLAG_READ
+                if recorded.is_restart:
+                    flags |= FLAG_RESTART
+                if recorded.nack:
+                    flags |= FLAG_NACK
+                delta = ticks_diff(t0, self._last)
+                self._last = t0
+                struct.pack_into(RECORD, self._header, 0,
+                                 delta if delta > 0 else 0, ticks_diff(t1, t0),
+                                 recorded.address, flags, self._length)
+                self._copy(self._record, self._header, RECORD_SIZE)
+                self.records += 1
+
+    # Write the buffered records to the file, returns the number of bytes written
+    def flush(self):
+        n = self._used
+        if not n:
+            return 0
+        size = len(self._buf)
+        tail = (self._head - n) % size
+        first = n if n < size - tail else size - tail
+        self.file.write(self._view[tail:tail + first])
+        if first < n:
+            self.file.write(self._view[:n - first])
+        self._used = 0
+        return n
+
+
+class Record:
+    def __init__(self, time, duration, address, flags, data):
+        self.time = time
+        self.duration = duration
+        self.address = address
+        self.flags = flags
+        self.data = data
+
+    @property
+    def is_read(self):
+        return bool(self.flags & FLAG_READ)
+
+    @property
+    def is_restart(self):
+        return bool(self.flags & FLAG_RESTART)
+
+    @property
+    def nack(self):
+        return bool(self.flags & FLAG_NACK)
+
+
+def records(file):
+    if file.read(len(HEADER)) != HEADER:
+        raise ValueError('Not a bus log')
+    start = 0
+    while True:
+        header = file.read(RECORD_SIZE)
+        if len(header) < RECORD_SIZE:
+            return
+        time, duration, address, flags, length = struct.unpack(RECORD, header)
+        data = file.read(length)
+        if len(data) < length:
+            raise ValueError('Truncated record')
+        start += time
+        yield Record(start, duration, address, flags, data)
+
+
+# Plays back a record: the master writes the recorded data or reads as many bytes
+class _ReplayRequest:
+    def __init__(self, record):
+        self.address = record.address
+        self.is_read = record.is_read
+        self.is_restart = record.is_restart
+        self.record = record
+        self.pos = 0
+        self.pending = False
+        self.nack = False
+        self.out = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        pass
+
+    def read(self, n=-1, ack=True):
+        if self.nack:
+            return b''
+        data = self.record.data
+        end = len(data) if n < 0 else min(self.pos + n, len(data))
+        buf = data[self.pos:end]
+        self.pos = end
+        self.pending = bool(buf) and not ack
+        return buf
+
+    def ack(self, ack=True):
+        self.pending = False
+        if not ack:
+            self.nack = True
+
+    def write(self, buf):
+        n = min(len(buf), len(self.record.data) - len(self.out))
+        self.out += buf[:n]
+        return n
+
+
+class Replayer:
+    def __init__(self, file):
+        self.file = file
+        self.transactions = 0
+        self.mismatches = 0
+        self.errors = []  # (record index, record, data written by the device) for the first mismatches
+
+    # process is a device's process() or I2CRouter.dispatch
+    def run(self, process, max_errors=10):
+        for record in records(self.file):
+            req = _ReplayRequest(record)
+            process(req)
+            if record.is_read:
+                ok = req.out == record.data
+            else:
+                ok = (req.nack or req.pending) == record.nack
+            if not ok:
+                self.mismatches += 1
+                if len(self.errors) < max_errors:
+                    self.errors.append((self.transactions, record, bytes(req.out)))
+            self.transactions += 1
+        return self.mismatches
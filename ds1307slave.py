@@ -1,5 +1,5 @@
 import time
-from smbusslave import SMBusSlave
+from smbusslave import SMBusSlave, Register, RegisterMap
 
 def bcd2bin(val):
     return (val & 0x0f) + ((val >> 4) * 10)
@@ -7,70 +7,118 @@ def bcd2bin(val):
 def bin2bcd(val):
     return ((val // 10) << 4) + val % 10
 
+# struct_time index of the time registers 0x00-0x06
+_TIME_INDEX = (5, 4, 3, 6, 2, 1, 0)
+
 class DS1307Slave(SMBusSlave):
+    __slots__ = ('rtc', 'ram', '_regbuf', 'regmap', 'datetime')
+
     def __init__(self, rtc, ram=None):
         super().__init__()
         self.rtc = rtc
         self.ram = ram
         self.protocol = SMBusSlave.SMBUS_BYTE_SEQ
         self.max_reg = 0x3f
-        self.debug = False
+        self._regbuf = bytearray(self.max_reg + 1)
+        # Only the clock and control registers, the RAM is served by readram() and writeram()
+        time_reg = Register(read=self._read_time, write=self._write_time)
+        registers = {}
+        for reg in range(0x07):
+            registers[reg] = time_reg
+        registers[0x07] = Register(readonly=True)  # Control register
+        self.regmap = RegisterMap(0x08, registers)
+        self.snapshot(0)
+
+    # Read the time once per read transaction, this also prevents tearing on a second rollover
+    def snapshot(self, reg):
+        self.datetime = self.rtc.datetime
+
+    def readregs(self, start, count):
+        buf = self._regbuf
+        t = self.datetime
+        buf[0x00] = bin2bcd(t.tm_sec)
+        buf[0x01] = bin2bcd(t.tm_min)
+        buf[0x02] = bin2bcd(t.tm_hour)
+        buf[0x03] = bin2bcd(t.tm_wday + 1)
+        buf[0x04] = bin2bcd(t.tm_mday)
+        buf[0x05] = bin2bcd(t.tm_mon)
+        buf[0x06] = bin2bcd(t.tm_year % 100)
+        buf[0x07] = 0  # Control register
+
+        size = len(buf) - 0x08
+        data = None
+        if self.ram:
+            self.ram.seek(0)
+            data = self.ram.read(size)
+        if data:
+            buf[0x08:0x08 + len(data)] = data
+            size -= len(data)
+        if size:
+            buf[len(buf) - size:] = bytes(size)
+
+        if start == 0 and count == len(buf):
+            return buf
+        return (buf[start:] + buf[:start])[:count]
 
     def readreg(self, reg):
-        t = self.rtc.datetime
-
-        if reg == 0x00:
-            val = bin2bcd(t.tm_sec)
-        elif reg == 0x01:
-            val = bin2bcd(t.tm_min)
-        elif reg == 0x02:
-            val = bin2bcd(t.tm_hour)
-        elif reg == 0x03:
-            val = bin2bcd(t.tm_wday + 1)
-        elif reg == 0x04:
-            val = bin2bcd(t.tm_mday)
-        elif reg == 0x05:
-            val = bin2bcd(t.tm_mon)
-        elif reg == 0x06:
-            val = bin2bcd(t.tm_year % 100)
-        elif reg == 0x07: # Control register
-            val = 0
-        else:
+        if reg >= 0x08:
             return self.readram(reg - 0x08)
-
-        if self.debug:
-            print(" 0x%02x==0x%02x" % (reg, val))
-        return val
+        return self.regmap.read(reg)
 
     def writereg(self, reg, val):
-        if self.debug:
-            print(" 0x%02x=0x%02x" % (reg, val))
-
-        if reg == 0x07: # Control register
-            return
-        elif reg > 0x07:
+        if reg >= 0x08:
             self.writeram(reg - 0x08, val)
-            return
+        else:
+            self.regmap.write(reg, val)
+
+    def _read_time(self, reg):
+        val = self.datetime[_TIME_INDEX[reg]]
+        if reg == 0x03:
+            val += 1
+        elif reg == 0x06:
+            val %= 100
+        return bin2bcd(val)
+
+    # Stored until commit()
+    def _write_time(self, reg, val):
+        self.regmap.regs[reg] = val
+
+    def writeregs(self, start, buf):
+        n = min(len(buf), self.max_reg + 1 - start)
+        self._writeregs(start, buf[:n])
+        if n < len(buf):
+            self._writeregs(0, buf[n:])
 
+    # buf must not wrap around
+    def _writeregs(self, reg, buf):
+        end = reg + len(buf)
+        regs = self.regmap.regs
+        for i in range(reg, min(end, 0x07)):
+            regs[i] = buf[i - reg]
+        if end > 0x08 and self.ram:
+            first = max(reg, 0x08)
+            self.ram.seek(first - 0x08)
+            self.ram.write(buf[first - reg:])
+
+    # Set the clock once for all the time registers written by the master
+    def commit(self, changed):
+        if not changed[0] & 0x7f:
+            return
         t = list(self.rtc.datetime)
+        regs = self.regmap.regs
+        for reg in range(0x07):
+            if changed[0] & (1 << reg):
+                self._settime(t, reg, regs[reg])
+        self.rtc.datetime = time.struct_time(tuple(t))
 
+    def _settime(self, t, reg, val):
         # AttributeError: can't set attribute
-        if reg == 0x00:
-            t[5] = bcd2bin(val)
-        elif reg == 0x01:
-            t[4] = bcd2bin(val)
-        elif reg == 0x02:
-            t[3] = bcd2bin(val)
-        elif reg == 0x03:
-            t[6] = bcd2bin(val) - 1
-        elif reg == 0x04:
-            t[2] = bcd2bin(val)
-        elif reg == 0x05:
-            t[1] = bcd2bin(val)
+        val = bcd2bin(val)
+        if reg == 0x03:
+            val -= 1
         elif reg == 0x06:
-            t[0] = (t[0] - (t[0] % 100)) + bcd2bin(val)
-
-        self.rtc.datetime = time.struct_time(tuple(t))
+            val += t[0] - (t[0] % 100)
+        t[_TIME_INDEX[reg]] = val
 
     def readram(self, addr):
         if self.ram:
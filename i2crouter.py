@@ -0,0 +1,67 @@
+# Dispatch I2CSlave requests to the device emulating each address
+#
+#   with I2CSlave(board.SCL, board.SDA, (0x20, 0x50, 0x68)) as slave:
+#       router = I2CRouter(slave)
+#       router.add(0x20, mcp23008)
+#       router.add(0x50, at24)
+#       router.add(0x68, ds1307)
+#       router.run()
+#
+# Devices can be added and removed while running. Only addresses passed to
+# I2CSlave are acknowledged by the hardware, requests to addresses without a
+# device are NACKed.
+
+class I2CRouter:
+    NUM_ADDRESSES = 128
+
+    def __init__(self, slave):
+        self.slave = slave
+        self.devices = [None] * I2CRouter.NUM_ADDRESSES
+        self._process = [None] * I2CRouter.NUM_ADDRESSES  # Bound process() methods
+        self.unclaimed = 0
+        self.errors = 0
+
+    def add(self, address, device):
+        if not 0 <= address < I2CRouter.NUM_ADDRESSES:
+            raise ValueError('Address out of range')
+        if self.devices[address] is not None:
+            raise ValueError('Address 0x%02x is in use' % (address,))
+        self.devices[address] = device
+        self._process[address] = device.process
+
+    def remove(self, address):
+        device = self.devices[address]
+        self.devices[address] = None
+        self._process[address] = None
+        return device
+
+    def dispatch(self, req):
+        process = self._process[req.address]
+        if process is None:
+            # Not mine
+            self.unclaimed += 1
+            if not req.is_read:
+                if req.read(1, ack=False):
+                    req.ack(False)
+            return
+        process(req)
+
+    # Handle one request, returns True if it was served. False if there was none
+    # or it failed, so a bus that keeps failing doesn't keep the caller draining.
+    # timeout is passed on to I2CSlave.request(): zero waits forever, negative checks once.
+    def poll(self, timeout=-1):
+        try:
+            req = self.slave.request(timeout=timeout)
+            if not req:
+                return False
+            with req:
+                self.dispatch(req)
+        except OSError as e:
+            self.errors += 1
+            print('ERROR:', e)
+            return False
+        return True
+
+    def run(self):
+        while True:
+            self.poll()
@@ -0,0 +1,322 @@
+# CPython stand-in for i2cslave.I2CSlave and I2CSlaveRequest
+#
+# Lets the device models run off-board. The master side is scripted with
+# I2CMaster, which feeds each message of a transfer to the slave as a request:
+#
+#   slave = I2CSlave(None, None, (0x68,))
+#   master = I2CMaster(slave, ds1307.process)
+#   master.write_byte_data(0x68, 0x08, 0x42)
+#   assert master.read_byte_data(0x68, 0x08) == 0x42
+#
+# Without a handler the requests are picked up by the usual request() loop,
+# the results end up in the Message objects when the transfer is done.
+#
+# install() provides digitalio, pulseio and rtc stand-ins when they're missing.
+
+import errno
+import sys
+import time
+
+
+class Message:
+    def __init__(self, data, read=False):
+        self.data = data  # Filled with the data read by the master
+        self.read = read
+
+
+class Transfer:
+    def __init__(self, address, messages):
+        self.address = address
+        self.messages = messages
+        self.index = 0
+        self.error = None
+
+    @property
+    def done(self):
+        return self.error is not None or self.index >= len(self.messages)
+
+
+class I2CSlaveRequest:
+    def __init__(self, slave, transfer, message, is_restart):
+        self._slave = slave
+        self._transfer = transfer
+        self._message = message
+        self.address = transfer.address
+        self.is_read = message.read
+        self.is_restart = is_restart
+        self._pos = 0
+        self._pending_ack = False
+        self._nacked = False
+        self._closed = False
+        self._out = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.close()
+
+    def _check(self):
+        if self._closed:
+            raise ValueError('Request is closed')
+
+    # Returns the bytes written by the master, ack=False leaves the last byte
+    # waiting for ack(), a NACK ends the transfer with an error for the master.
+    def read(self, n=-1, ack=True):
+        self._check()
+        if self.is_read:
+            raise OSError(errno.EIO, 'Not a write request')
+        if self._pending_ack:
+            raise OSError(errno.EIO, 'Waiting for ack()')
+        if self._nacked:
+            return b''
+        data = self._message.data
+        if n < 0:
+            n = len(data) - self._pos
+        n = min(n, len(data) - self._pos)
+        buf = bytes(data[self._pos:self._pos + n])
+        self._pos += n
+        if buf and not ack:
+            self._pending_ack = True
+        return buf
+
+    def ack(self, ack=True):
+        self._check()
+        if not self._pending_ack:
+            raise OSError(errno.EIO, 'Nothing to ack')
+        self._pending_ack = False
+        if not ack:
+            self._nacked = True
+
+    # Returns the number of bytes the master read
+    def write(self, buf):
+        self._check()
+        if not self.is_read:
+            raise OSError(errno.EIO, 'Not a read request')
+        n = min(len(buf), len(self._message.data) - len(self._out))
+        self._out += bytes(buf[:n])
+        return n
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        msg = self._message
+        if self._pending_ack:
+            self._nacked = True
+        if self._nacked:
+            self._transfer.error = OSError(errno.EREMOTEIO, 'Remote I/O error')
+        elif self.is_read:
+            # The bus is pulled high if the slave runs out of data
+            msg.data[:] = list(self._out) + [0xff] * (len(msg.data) - len(self._out))
+        self._slave._closed(self)
+
+
+class I2CSlave:
+    def __init__(self, scl, sda, addresses, smbus=True):
+        self.addresses = tuple(addresses)
+        self.smbus = smbus
+        self._transfers = []
+        self._current = None
+        self._deinited = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.deinit()
+
+    def deinit(self):
+        self._deinited = True
+
+    # timeout is ignored, returns None if no request is queued
+    def request(self, timeout=-1):
+        if self._deinited:
+            raise ValueError('Object has been deinitialized')
+        while self._current is None or self._current.done:
+            if not self._transfers:
+                self._current = None
+                return None
+            self._current = self._transfers.pop(0)
+        transfer = self._current
+        message = transfer.messages[transfer.index]
+        return I2CSlaveRequest(self, transfer, message, transfer.index > 0)
+
+    def _closed(self, req):
+        req._transfer.index += 1
+
+    # Master side: queue a transfer, the slave must ACK the address
+    def transfer(self, address, messages):
+        if address not in self.addresses:
+            raise OSError(errno.ENXIO, 'No such device or address')
+        transfer = Transfer(address, messages)
+        self._transfers.append(transfer)
+        return transfer
+
+
+class I2CMaster:
+    Message = Message
+
+    def __init__(self, slave, handler=None):
+        self.slave = slave
+        self.handler = handler  # Called with each request, typically device.process
+
+    def transfer(self, address, messages):
+        transfer = self.slave.transfer(address, messages)
+        if self.handler is None:
+            return transfer
+        while not transfer.done:
+            req = self.slave.request()
+            with req:
+                self.handler(req)
+        if transfer.error:
+            raise transfer.error
+        return transfer
+
+    def read(self, address, n):
+        msgs = [Message([0] * n, read=True)]
+        self.transfer(address, msgs)
+        return msgs[0].data
+
+    def write(self, address, data):
+        self.transfer(address, [Message(list(data))])
+
+    def write_read(self, address, data, n):
+        msgs = [Message(list(data)), Message([0] * n, read=True)]
+        self.transfer(address, msgs)
+        return msgs[1].data
+
+    # smbus.SMBus compatible helpers, emulated over I2C like Linux does
+
+    def read_byte_data(self, address, reg):
+        return self.write_read(address, [reg], 1)[0]
+
+    def write_byte_data(self, address, reg, val):
+        self.write(address, [reg, val])
+
+    def read_word_data(self, address, reg):
+        data = self.write_read(address, [reg], 2)
+        return data[0] | data[1] << 8
+
+    def write_word_data(self, address, reg, val):
+        self.write(address, [reg, val & 0xff, val >> 8])
+
+    def process_call(self, address, reg, val):
+        data = self.write_read(address, [reg, val & 0xff, val >> 8], 2)
+        return data[0] | data[1] << 8
+
+    def read_block_data(self, address, reg):
+        data = self.write_read(address, [reg], 33)
+        return data[1:1 + data[0]]
+
+    def write_block_data(self, address, reg, vals):
+        self.write(address, [reg, len(vals)] + list(vals))
+
+    def read_i2c_block_data(self, address, reg, length=32):
+        return self.write_read(address, [reg], length)
+
+    def write_i2c_block_data(self, address, reg, vals):
+        self.write(address, [reg] + list(vals))
+
+
+# digitalio, pulseio and rtc stand-ins
+
+class _Enum:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class Direction:
+    INPUT = _Enum('digitalio.Direction.INPUT')
+    OUTPUT = _Enum('digitalio.Direction.OUTPUT')
+
+
+class DriveMode:
+    PUSH_PULL = _Enum('digitalio.DriveMode.PUSH_PULL')
+    OPEN_DRAIN = _Enum('digitalio.DriveMode.OPEN_DRAIN')
+
+
+class Pull:
+    UP = _Enum('digitalio.Pull.UP')
+    DOWN = _Enum('digitalio.Pull.DOWN')
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.drive_mode = DriveMode.PUSH_PULL
+        self.pull = None
+        self.value = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.deinit()
+
+    def deinit(self):
+        pass
+
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.value = bool(value)
+        self.drive_mode = drive_mode
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+        self.value = pull == Pull.UP
+
+
+class PulseIn:
+    def __init__(self, pin, maxlen=2, idle_state=False):
+        self.pin = pin
+        self.maxlen = maxlen
+        self.pulses = []
+
+    def __len__(self):
+        return len(self.pulses)
+
+    def popleft(self):
+        return self.pulses.pop(0)
+
+    def deinit(self):
+        pass
+
+
+class RTC:
+    def __init__(self):
+        self._offset = 0
+
+    @property
+    def datetime(self):
+        return time.localtime(time.time() + self._offset)
+
+    @datetime.setter
+    def datetime(self, t):
+        self._offset = time.mktime(t) - time.time()
+
+
+def _module(name, attrs):
+    mod = type(sys)(name)
+    for attr in attrs:
+        setattr(mod, attr, globals()[attr])
+    return mod
+
+
+def install():
+    modules = {
+        'digitalio': ('Direction', 'DriveMode', 'Pull', 'DigitalInOut'),
+        'pulseio': ('PulseIn',),
+        'rtc': ('RTC',),
+    }
+    for name, attrs in modules.items():
+        if name not in sys.modules:
+            try:
+                __import__(name)
+            except ImportError:
+                sys.modules[name] = _module(name, attrs)
@@ -1,6 +1,7 @@
 import digitalio
 import pulseio
-from smbusslave import SMBusSlave
+import tracer
+from smbusslave import SMBusSlave, Register, RegisterMap
 
 IODIR = 0x00
 IPOL = 0x01
@@ -24,6 +25,8 @@ IOCON_INTPOL = 1 << 1
 # Interrupts are not working yet, need PulseIn.value
 
 class MCP23008Slave(SMBusSlave):
+    __slots__ = ('pins', 'int', 'regmap', 'regs', '_pinmode', '_olat', 'readreg', 'writereg')
+
     def __init__(self, pins, intpin=None):
         if len(pins) == 0:
             raise ValueError('pins is empty')
@@ -36,9 +39,21 @@ class MCP23008Slave(SMBusSlave):
             self.int.switch_to_output(True)
         self.protocol = SMBusSlave.SMBUS_BYTE_SEQ
         self.max_reg = 0x0a
-        self.regs = [0] * (self.max_reg + 1)
-        self.regs[IODIR] = 0xff
-        self.debug2 = False
+        self.regmap = RegisterMap(self.max_reg + 1, {
+            IODIR: Register(0xff, write=self._write_pinmode),
+            IPOL: Register(write=self._write_ipol),
+            GPINTEN: Register(write=self._write_pinmode),
+            IOCON: Register(wmask=0b00111110, write=self._write_iocon),
+            GPPU: Register(write=self._write_pinmode),
+            INTF: Register(readonly=True),
+            INTCAP: Register(readonly=True, read=self._read_intcap),
+            GPIO: Register(read=self._read_gpio, write=self._write_gpio),
+        })
+        self.regs = self.regmap.regs
+        self._pinmode = 0
+        self._olat = self.regs[OLAT]  # OLAT as last applied to the pins
+        self.readreg = self.regmap.read
+        self.writereg = self.regmap.write
 
     def check_events(self):
         prev_intf = self.regs[INTF]
@@ -55,81 +70,77 @@ class MCP23008Slave(SMBusSlave):
             self.regs[INTCAP] = val
             self.set_interrupt()
 
-    def readreg(self, reg):
-        if reg == GPIO:
-            val = 0
-            for i in range(8):
-                if self.regs[IODIR] & (1 << i):  # Is this an input?
-                    val |= self.pins[i].value << i
-                else:
-                    val |= self.regs[OLAT] & (1 << i)
+    def writeregs(self, start, buf):
+        self.regmap.writeregs(start, buf)
 
-            if self.regs[INTF]:
-                self.regs[INTF] = 0
-                self.clear_interrupt()
+    # The pins are updated once when the master is done writing
+    def commit(self, changed):
+        olat = self._olat
+        self._olat = self.regs[OLAT]
+        self.updatepins(olat)
 
-        elif reg == INTCAP:
-            val = self.regs[INTCAP]
-            if self.regs[INTF]:
-                self.regs[INTF] = 0
-                self.clear_interrupt()
+    def _read_gpio(self, reg):
+        val = 0
+        for i in range(8):
+            if self.regs[IODIR] & (1 << i):  # Is this an input?
+                val |= self.pins[i].value << i
+            else:
+                val |= self.regs[OLAT] & (1 << i)
 
-        else:
-            val = self.regs[reg]
+        if self.regs[INTF]:
+            self.regs[INTF] = 0
+            self.clear_interrupt()
+        return val
 
-        if self.debug2:
-            print(" 0x%02x==0x%02x" % (reg, val))
+    def _read_intcap(self, reg):
+        val = self.regs[INTCAP]
+        if self.regs[INTF]:
+            self.regs[INTF] = 0
+            self.clear_interrupt()
         return val
 
-    def writereg(self, reg, val):
-        if self.debug2:
-            print(" 0x%02x=0x%02x" % (reg, val))
-
-        changed = self.regs[reg] ^ val
-
-        if reg == IODIR:
-            self.regs[IODIR] = val
-            self.setpinmode(changed)
-        elif reg == IPOL:
-            if val:
-                # Not used by the Linux driver
-                raise NotImplementedError('IPOL is not implemented')
-        elif reg == GPINTEN:
-            self.regs[GPINTEN] = val
-            self.setpinmode(changed)
-        elif reg == DEFVAL:
-            pass
-        elif reg == INTCON:
-            pass
-        elif reg == IOCON:
-            val &= 0b00111110
-            if val & IOCON_SEQOP:
-                # Not used by the Linux driver
-                raise NotImplementedError('IOCON:SEQOP is not implemented')
-            if self.int:
-                if changed & IOCON_ODR:
-                    if val & IOCON_ODR:
-                        self.int.drive_mode = digitalio.DriveMode.OPEN_DRAIN
-                    else:
-                        self.int.drive_mode = digitalio.DriveMode.PUSH_PULL
-                if changed & IOCON_INTPOL:
-                    self.int.value = not val & IOCON_INTPOL
-        elif reg == GPPU:
-            self.regs[GPPU] = val
-            self.setpinmode(changed)
-        elif reg == INTF:
-            return  # Read only
-        elif reg == INTCAP:
-            return  # Read only
-        elif reg == GPIO or reg == OLAT:
-            if reg == GPIO:
-                self.regs[OLAT] = val
+    # IODIR, GPINTEN, GPPU: the pins are updated by updatepins()
+    def _write_pinmode(self, reg, val):
+        self._pinmode |= self.regs[reg] ^ val
+        self.regs[reg] = val
+
+    def _write_ipol(self, reg, val):
+        if val:
+            # Not used by the Linux driver
+            raise NotImplementedError('IPOL is not implemented')
+
+    def _write_iocon(self, reg, val):
+        changed = self.regs[IOCON] ^ val
+        if changed & IOCON_SEQOP:
+            # Sequential operation disabled: the address pointer doesn't increment
+            self.increment(SMBusSlave.INC_NONE if val & IOCON_SEQOP else SMBusSlave.INC_LINEAR)
+        if self.int:
+            if changed & IOCON_ODR:
+                if val & IOCON_ODR:
+                    self.int.drive_mode = digitalio.DriveMode.OPEN_DRAIN
+                else:
+                    self.int.drive_mode = digitalio.DriveMode.PUSH_PULL
+            if changed & IOCON_INTPOL:
+                self.int.value = not val & IOCON_INTPOL
+        self.regs[IOCON] = val
+
+    def _write_gpio(self, reg, val):
+        self.regs[OLAT] = val
+        self.regs[GPIO] = val
+
+    # Apply register changes to the pins in one go
+    def updatepins(self, olat):
+        pinmode = self._pinmode
+        if pinmode:
+            self._pinmode = 0
+            self.setpinmode(pinmode)
+        # Outputs that changed value and didn't get it through setpinmode()
+        changed = (olat ^ self.regs[OLAT]) & ~self.regs[IODIR] & ~pinmode
+        if changed:
             for i in range(8):
                 mask = 1 << i
-                if changed & mask and not self.regs[IODIR] & mask:  # Changed and not input
-                    self.pins[i].value = val & mask
-
-        self.regs[reg] = val
+                if changed & mask:
+                    self.pins[i].value = self.regs[OLAT] & mask
 
     def setpinmode(self, changed):
         for i in range(8):
@@ -144,15 +155,15 @@ class MCP23008Slave(SMBusSlave):
                     self.pins[i].switch_to_output(val)
 
     def set_interrupt(self):
-        if self.debug2:
-            print('\nset_interrupt: INTF=%02x INTCAP=%02x\n' % (self.regs[INTF], self.regs[INTCAP]))
+        if self.tracer:
+            self.tracer.record(tracer.INTERRUPT, self.regs[INTF], 1)
         if self.int:
             active = bool(self.regs[IOCON] & IOCON_INTPOL)
             self.int.value = active
 
     def clear_interrupt(self):
-        if self.debug2:
-            print('\nclear_interrupt\n')
+        if self.tracer:
+            self.tracer.record(tracer.INTERRUPT, self.regs[INTF], 0)
         if self.int:
             active = bool(self.regs[IOCON] & IOCON_INTPOL)
             self.int.value = not active
@@ -160,6 +171,8 @@ class MCP23008Slave(SMBusSlave):
 
 # Doubles as a DigitalInOut and PulseIn dummy for the Pin class
 class DummyIO:
+    __slots__ = ('direction', 'drive_mode', 'value', 'pull')
+
     def __init__(self):
         self.direction = digitalio.Direction.INPUT
         self.drive_mode = digitalio.DriveMode.PUSH_PULL
@@ -184,15 +197,18 @@ class DummyIO:
 
 
 class Pin:
+    __slots__ = ('pin', 'index', 'io', 'pulseio', 'pulseio_val', '_interrupt')
+
+    pulseio_maxlen = 10
+    tracer = None  # Set Pin.tracer to a tracer.Tracer to trace all pins
+
     def __init__(self, pin, index):
         self.pin = pin
         self.index = index
         self.io = None
         self.pulseio = None
         self.pulseio_val = None
-        self.pulseio_maxlen = 10
         self._interrupt = False
-        self.debug = False
         if self.pin is None:
             self.io = DummyIO()
             self.pulseio = self.io
@@ -202,8 +218,8 @@ class Pin:
 
     def switch_to_output(self, value=False, drive_mode=digitalio.DriveMode.PUSH_PULL):
         self._ensure_io()
-        if self.debug:
-            print('%d.switch_to_output(%r)' % (self.index, value,))
+        if self.tracer:
+            self.tracer.record(tracer.PIN_OUTPUT, self.index, bool(value))
         self.io.switch_to_output(value)
 
     # Edge/level?
@@ -212,23 +228,23 @@ class Pin:
             self._ensure_pulseio()
         else:
             self._ensure_io()
-            if self.debug:
-                print('%s.switch_to_input(%r)' % (self.index, pull,))
+            if self.tracer:
+                self.tracer.record(tracer.PIN_INPUT, self.index, pull == digitalio.Pull.UP)
             self.io.switch_to_input(pull)
 
     @property
     def value(self):
         if self.io is not None:
             val = bool(self.io.value)
-            if self.debug and self.pin:
-                print('%s.value == %r' % (self.index, val,))
+            if self.tracer and self.pin:
+                self.tracer.record(tracer.PIN_GET, self.index, val)
             return val
 
         if self.pulseio is not None:
             val = self._get_pulseio_value()
             if val is not None:
-                if self.debug:
-                    print('%s.value == %r (%d)' % (self.index, val, len(self.pulseio)))
+                if self.tracer:
+                    self.tracer.record(tracer.PIN_GET, self.index, val)
                 return val
 
             # Unable to determine value so look at the pin
@@ -239,8 +255,8 @@ class Pin:
             tmp.deinit()
             self.pulseio = None
             self._ensure_pulseio()
-            if self.debug:
-                print('%s.value(DIG) == %r' % (self.index, val,))
+            if self.tracer:
+                self.tracer.record(tracer.PIN_GET, self.index, val)
             return val
 
         raise ValueError('bug: neither io nor pulseio is set')
@@ -251,8 +267,8 @@ class Pin:
             raise AttributeError('Cannot set value when direction is input.')
         val = bool(val)
         self.io.value = val
-        if self.debug:
-            print('%s.value = %r' % (self.index, val,))
+        if self.tracer:
+            self.tracer.record(tracer.PIN_SET, self.index, val)
 
     @property
     def interrupt(self):
@@ -285,25 +301,17 @@ class Pin:
         if self.pin is None:
             return
         if self.pulseio is not None:
-            if self.debug:
-                print('%s.PulseIn(%r).deinit()' % (self.index, self.pin,))
             self.pulseio.deinit()
             self.pulseio = None
         if self.io is None:
-            if self.debug:
-                print('%d = DigitalInOut(%r)' % (self.index, self.pin,))
             self.io = digitalio.DigitalInOut(self.pin)
 
     def _ensure_pulseio(self):
         if self.pin is None:
             return
         if self.io is not None:
-            if self.debug:
-                print('%s.DigitalInOut(%r).deinit()' % (self.index, self.pin,))
             self.io.deinit()
             self.io = None
         if self.pulseio is None:
-            if self.debug:
-                print('%s = PulseIn(%r, maxlen=%d)' % (self.index, self.pin, self.pulseio_maxlen,))
             self.pulseio = pulseio.PulseIn(self.pin, maxlen=self.pulseio_maxlen) # , idle_state=False)
             self.pulseio_val = None
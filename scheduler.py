@@ -0,0 +1,60 @@
+# Run device background work while the I2C bus is idle
+#
+#   router = I2CRouter(slave)
+#   scheduler = Scheduler(router)
+#   scheduler.add(mcp23008.check_events)
+#   scheduler.run()
+#
+# A task is either a callable that does one short slice of work per call,
+# or a generator that yields between slices and is removed when it's done.
+# Pending requests are served before every slice, so the request pickup
+# latency is bounded by the longest slice.
+
+from ticks import monotonic_ns
+
+
+class Scheduler:
+    def __init__(self, router):
+        self.router = router  # Anything with poll() like I2CRouter
+        self.tasks = []
+        self._index = 0
+        self.max_slice_ns = 0  # Worst case slice, ie. request pickup latency
+
+    def add(self, task):
+        self.tasks.append(task)
+
+    def remove(self, task):
+        i = self.tasks.index(task)
+        del self.tasks[i]
+        if self._index > i:
+            self._index -= 1
+
+    # Serve pending requests, then run one task slice
+    def step(self):
+        poll = self.router.poll
+        while poll():
+            pass
+
+        tasks = self.tasks
+        if not tasks:
+            return
+        if self._index >= len(tasks):
+            self._index = 0
+        task = tasks[self._index]
+        self._index += 1
+
+        start = monotonic_ns()
+        if hasattr(task, 'send'):
+            try:
+                next(task)
+            except StopIteration:
+                self.remove(task)
+        else:
+            task()
+        elapsed = monotonic_ns() - start
+        if elapsed > self.max_slice_ns:
+            self.max_slice_ns = elapsed
+
+    def run(self):
+        while True:
+            self.step()
@@ -1,13 +1,135 @@
+from array import array
+import tracer
+from ticks import monotonic_ns, ticks_us, ticks_diff
+
+
+def _crc8_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x07) & 0xff  # x^8 + x^2 + x + 1
+            else:
+                crc = (crc << 1) & 0xff
+        table[i] = crc
+    return bytes(table)
+
+CRC8_TABLE = _crc8_table()
+
+def crc8(crc, data):
+    table = CRC8_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
 
 class SMBusSlave:
+    __slots__ = ('_increment', '_max_reg', '_next', 'tracer', 'latency', '_timedreq', 'regnr',
+                 '_protocol', '_pec', '_crc', 'pec_errors', 'deadline', 'deadline_misses',
+                 'fallback', '_t0', '_changed', '_dirty', '_has_commit', '_has_snapshot',
+                 '_process_write', '_process_read', '_regsbuf', '_regsview', '_blockbuf',
+                 '_blockview', '_readinto', '_reqtype', '_rxbuf', '_rx1', '_rx2', '_txbuf',
+                 '_tx1', '_tx2', '_tx3', '_callbuf', '_call2', '_call3', '_call_valid')
+
     (SMBUS_BYTE, SMBUS_WORD,
      SMBUS_BYTE_SEQ, SMBUS_WORD_SEQ, # non-std sequential byte/word access (from Linux)
      SMBUS_PROCESS_CALL, SMBUS_BLOCK, SMBUS_BLOCK_PROC_CALL,
      SMBUS_HOST_NOTIFY) = range(8)
 
+    # Master write handler, master read handler,
+    # master write handler using writeregs(), master read handler using readregs()
+    _handlers = {
+        SMBUS_BYTE: ('_read_byte', '_write_byte', None, None),
+        SMBUS_BYTE_SEQ: ('_read_byte_seq', '_write_byte_seq', '_read_byte_regs', '_write_byte_regs'),
+        SMBUS_WORD: ('_read_word', '_write_word', None, None),
+        SMBUS_WORD_SEQ: ('_read_word_seq', '_write_word_seq', '_read_word_regs', '_write_word_regs'),
+        SMBUS_PROCESS_CALL: ('_read_call', '_write_call', None, None),
+        SMBUS_BLOCK: ('_read_block', '_write_block', None, None),
+        SMBUS_BLOCK_PROC_CALL: ('_read_block', '_write_block', None, None),
+    }
+
+    # Handlers used when PEC is enabled, the sequential protocols don't support PEC
+    _pec_handlers = {
+        SMBUS_BYTE: ('_read_byte_pec', '_write_byte_pec'),
+        SMBUS_WORD: ('_read_word_pec', '_write_word_pec'),
+        SMBUS_PROCESS_CALL: ('_read_call_pec', '_write_call_pec'),
+        SMBUS_BLOCK: ('_read_block_pec', '_write_block_pec'),
+        SMBUS_BLOCK_PROC_CALL: ('_read_block_crc', '_write_block_pec'),
+    }
+
+    # Register auto-increment policies for the sequential protocols, see increment()
+    INC_LINEAR, INC_GROUP, INC_NONE = range(3)
+
+    BLOCK_MAX = 32
+
+    # The sequential protocols check the deadline every DEADLINE_INTERVAL registers
+    DEADLINE_INTERVAL = 8
+
+    # Optional bulk read: readregs(start, count) returns a buffer holding count registers
+    # starting at start, wrapping around at max_reg. Words are little endian.
+    # Only used with the INC_LINEAR policy.
+    readregs = None
+
+    # Optional bulk write: writeregs(start, buf) is passed a memoryview of the registers
+    # written by the master starting at start, wrapping around at max_reg.
+    # Words are little endian. Only used with the INC_LINEAR policy.
+    writeregs = None
+
+    # Optional snapshot(reg) is called when the master starts reading after the command.
+    # Devices can use it to read expensive or changing state once and serve the
+    # following register reads from it, making multi-register values consistent.
+    # Pure writes don't take a snapshot.
+    snapshot = None
+
+    # Optional commit(changed) is called when the master is done writing, changed is
+    # a bytearray bitmap of the registers written: reg is bit reg & 7 of changed[reg >> 3].
+    # It's cleared when commit() returns. Devices can store the values during the
+    # transfer and apply the side effects in one go from here.
+    commit = None
+
     def __init__(self):
+        self._increment = (SMBusSlave.INC_LINEAR, None)
         self.max_reg = 0
-        self.debug = 0
+        self.tracer = None  # tracer.Tracer
+        self.latency = None  # Latency
+        self._timedreq = None
+        self.regnr = 0
+        self._protocol = None
+        self._pec = False
+        self._crc = 0
+        self.pec_errors = 0
+        # Microseconds from the start of the transaction before giving up, None disables.
+        # SMBus allows a slave to stretch the clock 25 ms in total. It's checked when the
+        # request starts and then every DEADLINE_INTERVAL registers, using ticks_us().
+        self.deadline = None
+        self.deadline_misses = 0
+        self.fallback = 0xff  # Served to the master once the deadline has passed
+        self._t0 = 0
+        self._dirty = False  # Registers have been written since the last commit()
+        # The hooks are looked up once, self.commit allocates a bound method
+        self._has_commit = type(self).commit is not None
+        self._has_snapshot = type(self).snapshot is not None
+        self._process_write = self._not_implemented
+        self._process_read = self._not_implemented
+        self._regsbuf = b''  # Sized by _read_regs()
+        self._regsview = None
+        self._blockbuf = None  # Allocated by _resolve() for the block protocols
+        self._blockview = None
+        # Preallocated buffers and views so serving a register doesn't allocate.
+        # The bulk and block paths slice the views which does allocate on MicroPython.
+        # A request either receives or transmits, so rx and tx share the buffer.
+        self._readinto = False
+        self._reqtype = None
+        self._rxbuf = self._txbuf = bytearray(3)  # Byte/word + PEC
+        view = memoryview(self._rxbuf)
+        self._rx1 = self._tx1 = view[:1]
+        self._rx2 = self._tx2 = view[:2]
+        self._tx3 = view
+        self._callbuf = None  # Allocated by _resolve() for SMBUS_PROCESS_CALL
+        self._call2 = None
+        self._call3 = None
+        self._call_valid = False  # _callbuf holds the response to the last write
 
     def writereg(self, reg, val):
         raise NotImplementedError
@@ -15,107 +137,728 @@ class SMBusSlave:
     def readreg(self, reg):
         raise NotImplementedError
 
+    # SMBUS_PROCESS_CALL: Return the response word. This is called when the master
+    # has written the word, so the response is ready when the read part arrives.
+    def processcall(self, reg, val):
+        raise NotImplementedError
+
+    # SMBUS_BLOCK and SMBUS_BLOCK_PROC_CALL: Return a buffer with at most BLOCK_MAX bytes
+    def readblock(self, reg):
+        raise NotImplementedError
+
+    # SMBUS_BLOCK and SMBUS_BLOCK_PROC_CALL: buf is a memoryview of the data (without length)
+    def writeblock(self, reg, buf):
+        raise NotImplementedError
+
+    @property
+    def max_reg(self):
+        return self._max_reg
+
+    @max_reg.setter
+    def max_reg(self, max_reg):
+        self._max_reg = max_reg
+        self._changed = bytearray((max_reg + 8) // 8)  # Bitmap for commit()
+        self._build_next()
+
+    # Set the register auto-increment policy of the sequential protocols:
+    #   INC_LINEAR: Next register, wrap around to 0 after max_reg (default)
+    #   INC_GROUP: Wrap around within groups of arg registers
+    #   INC_NONE: Stay on the same register
+    # A callable policy is called as policy(reg) and returns the next register.
+    def increment(self, policy, arg=None):
+        if policy == SMBusSlave.INC_GROUP and not (isinstance(arg, int) and arg > 0):
+            raise ValueError('INC_GROUP needs the group size as a positive int')
+        self._increment = (policy, arg)
+        self._build_next()
+        if self._protocol is not None:
+            self._resolve()
+
+    # Next register lookup table used by _seq_reg_inc()
+    def _build_next(self):
+        policy, arg = self._increment
+        size = self._max_reg + 1
+        if policy == SMBusSlave.INC_LINEAR:
+            nxt = [(reg + 1) % size for reg in range(size)]
+        elif policy == SMBusSlave.INC_GROUP:
+            nxt = []
+            for reg in range(size):
+                first = reg - reg % arg
+                nxt.append(reg + 1 if reg + 1 < min(first + arg, size) else first)
+        elif policy == SMBusSlave.INC_NONE:
+            nxt = list(range(size))
+        elif callable(policy):
+            nxt = [policy(reg) % size for reg in range(size)]
+        else:
+            raise ValueError('Unknown increment policy')
+        self._next = bytearray(nxt)
+
     def command(self, command):
-        if command > self.max_reg:
+        if command > self._max_reg:
             return False;
         self.regnr = command
         return True
 
+    @property
+    def protocol(self):
+        return self._protocol
+
+    @protocol.setter
+    def protocol(self, protocol):
+        if protocol not in self._handlers:
+            raise NotImplementedError
+        self._protocol = protocol
+        self._resolve()
+
+    # Packet Error Checking for SMBUS_BYTE, SMBUS_WORD, SMBUS_PROCESS_CALL, SMBUS_BLOCK and
+    # SMBUS_BLOCK_PROC_CALL. The sequential protocols ignore it.
+    @property
+    def pec(self):
+        return self._pec
+
+    @pec.setter
+    def pec(self, pec):
+        self._pec = bool(pec)
+        if self._protocol is not None:
+            self._resolve()
+
+    # Resolve the handlers once so process() doesn't have to look at the protocol
+    def _resolve(self):
+        handlers = self._handlers[self._protocol]
+        if self._blockbuf is None and handlers[0] == '_read_block':
+            self._blockbuf = bytearray(2 + SMBusSlave.BLOCK_MAX)  # Length + data + PEC
+            self._blockview = memoryview(self._blockbuf)
+        if self._callbuf is None and handlers[0] == '_read_call':
+            self._callbuf = bytearray(3)  # Process call response + PEC
+            view = memoryview(self._callbuf)
+            self._call2 = view[:2]
+            self._call3 = view
+        if self._pec and self._protocol in self._pec_handlers:
+            pec_handlers = self._pec_handlers[self._protocol]
+            self._process_write = getattr(self, pec_handlers[0])
+            self._process_read = getattr(self, pec_handlers[1])
+            return
+        linear = self._increment[0] == SMBusSlave.INC_LINEAR
+        if self.writeregs is not None and handlers[2] and linear:
+            self._process_write = getattr(self, handlers[2])
+        else:
+            self._process_write = getattr(self, handlers[0])
+        if self.readregs is not None and handlers[3] and linear:
+            self._process_read = getattr(self, handlers[3])
+        else:
+            self._process_read = getattr(self, handlers[1])
+
     def _seq_reg_inc(self):
-        if self.protocol == SMBusSlave.SMBUS_BYTE_SEQ or self.protocol == SMBusSlave.SMBUS_WORD_SEQ:
-            self.regnr += 1
-            if self.regnr > self.max_reg:
-                self.regnr = 0
+        self.regnr = self._next[self.regnr]
+
+    # Mark registers as written for commit(), wrapping around at max_reg
+    def _written(self, start, count=1):
+        self._dirty = True
+        changed = self._changed
+        last = self._max_reg
+        reg = start
+        while count:
+            changed[reg >> 3] |= 1 << (reg & 7)
+            reg = reg + 1 if reg < last else 0
+            count -= 1
+
+    def _commit(self):
+        self._dirty = False
+        changed = self._changed
+        self.commit(changed)
+        i = len(changed)
+        while i:
+            i -= 1
+            changed[i] = 0
+
+    def _overdue(self):
+        return ticks_diff(ticks_us(), self._t0) > self.deadline
+
+    # Out of time: serve fallback data until the master stops or NACK the next byte
+    def _abort(self, req):
+        self.deadline_misses += 1
+        if self.tracer:
+            self.tracer.record(tracer.DEADLINE, self.regnr)
+        if req.is_read:
+            self._txbuf[0] = self.fallback
+            while req.write(self._tx1) == 1:
+                pass
+        elif self._recv(req, self._rx1, False):
+            req.ack(False)
+        return False
+
+    def _not_implemented(self, req):
+        raise NotImplementedError
+
+    # Read into a preallocated buffer, returns the number of bytes read.
+    # Uses readinto() if the request has it, otherwise the data is copied.
+    def _recv(self, req, view, ack=True):
+        if self._readinto:
+            return req.readinto(view, ack=ack)
+        data = req.read(len(view), ack=ack)
+        n = len(data)
+        if n:
+            view[:n] = data
+        return n
 
     def _read_byte(self, req):
-        if self.debug > 1:
-            print("_read_byte: ", end='')
-        byte = req.read(1)
-        if self.debug > 1:
-            print(byte)
-        if not byte:
+        if not self._recv(req, self._rx1):
             return False
-        self.writereg(self.regnr, byte[0])
-        self._seq_reg_inc()
+        if self.tracer:
+            self.tracer.record(tracer.WRITEREG, self.regnr, self._rxbuf[0])
+        if self._has_commit:
+            self._written(self.regnr)
+        self.writereg(self.regnr, self._rxbuf[0])
         return True
 
+    def _read_byte_seq(self, req):
+        n = 0
+        while self._read_byte(req):
+            self._seq_reg_inc()
+            n += 1
+            if n == SMBusSlave.DEADLINE_INTERVAL:
+                n = 0
+                if self.deadline is not None and self._overdue():
+                    return self._abort(req)
+        return False
+
+    def _read_regs(self, req, width):
+        count = self._max_reg + 1
+        size = count * width
+        if len(self._regsbuf) != size:
+            self._regsbuf = bytearray(size)
+            self._regsview = memoryview(self._regsbuf)
+        while True:
+            received = self._recv(req, self._regsview)
+            n = received - received % width
+            if self.tracer:
+                self.tracer.record(tracer.WRITEREGS, self.regnr, received // width)
+            if not n:
+                return False
+            if self._has_commit:
+                self._written(self.regnr, n // width)
+            self.writeregs(self.regnr, self._regsview if n == size else self._regsview[:n])
+            self.regnr = (self.regnr + n // width) % count
+            if received < size:
+                return False
+            if self.deadline is not None and self._overdue():
+                return self._abort(req)
+
+    def _read_byte_regs(self, req):
+        return self._read_regs(req, 1)
+
     def _write_byte(self, req):
         byte = self.readreg(self.regnr)
-        if self.debug > 1:
-            print(" byte=0x%02x" % (byte,), end='')
-        if req.write(byte.to_bytes(1, 'little')) != 1:
-            return False
-        self._seq_reg_inc()
-        return True
+        if self.tracer:
+            self.tracer.record(tracer.READREG, self.regnr, byte)
+        self._txbuf[0] = byte
+        return req.write(self._tx1) == 1
+
+    def _write_byte_seq(self, req):
+        n = 0
+        while self._write_byte(req):
+            self._seq_reg_inc()
+            n += 1
+            if n == SMBusSlave.DEADLINE_INTERVAL:
+                n = 0
+                if self.deadline is not None and self._overdue():
+                    return self._abort(req)
+        return False
+
+    # Hand the master the whole register file and start over if it wants more
+    def _write_regs(self, req, width):
+        count = self._max_reg + 1
+        while True:
+            buf = self.readregs(self.regnr, count)
+            n = req.write(buf)
+            if self.tracer:
+                self.tracer.record(tracer.READREGS, self.regnr, n // width)
+            self.regnr = (self.regnr + n // width) % count
+            if n < len(buf):
+                return False
+            if self.deadline is not None and self._overdue():
+                return self._abort(req)
+
+    def _write_byte_regs(self, req):
+        return self._write_regs(req, 1)
 
     def _read_word(self, req):
-        word = req.read(2)
-        if len(word) != 2:
+        if self._recv(req, self._rx2) != 2:
             return False
+        word = self._rxbuf
+        if self._has_commit:
+            self._written(self.regnr)
         self.writereg(self.regnr, word[1] << 8 | word[0])
-        self._seq_reg_inc()
         return True
 
+    def _read_word_seq(self, req):
+        n = 0
+        while self._read_word(req):
+            self._seq_reg_inc()
+            n += 1
+            if n == SMBusSlave.DEADLINE_INTERVAL:
+                n = 0
+                if self.deadline is not None and self._overdue():
+                    return self._abort(req)
+        return False
+
+    def _read_word_regs(self, req):
+        return self._read_regs(req, 2)
+
     def _write_word(self, req):
         word = self.readreg(self.regnr)
-        if self.debug > 1:
-            print(" word=0x%04x" % (word,), end='')
-        if req.write(word.to_bytes(2, 'little')) != 2:
+        if self.tracer:
+            self.tracer.record(tracer.READREG, self.regnr, word)
+        buf = self._txbuf
+        buf[0] = word & 0xff
+        buf[1] = word >> 8
+        return req.write(self._tx2) == 2
+
+    def _write_word_seq(self, req):
+        n = 0
+        while self._write_word(req):
+            self._seq_reg_inc()
+            n += 1
+            if n == SMBusSlave.DEADLINE_INTERVAL:
+                n = 0
+                if self.deadline is not None and self._overdue():
+                    return self._abort(req)
+        return False
+
+    def _write_word_regs(self, req):
+        return self._write_regs(req, 2)
+
+    def _read_call(self, req):
+        self._call_valid = False
+        if self._recv(req, self._rx2) != 2:
+            return False
+        word = self._rxbuf
+        val = self.processcall(self.regnr, word[1] << 8 | word[0])
+        if self.tracer:
+            self.tracer.record(tracer.PROCESS_CALL, self.regnr, val)
+        buf = self._callbuf
+        buf[0] = val & 0xff
+        buf[1] = val >> 8
+        self._call_valid = True
+        return True
+
+    # Only the response to the write part is sent, and only once
+    def _write_call(self, req):
+        if not self._call_valid:
+            return False
+        self._call_valid = False
+        return req.write(self._call2) == 2
+
+    # Reads length and data into _blockbuf, returns the length
+    def _read_block_data(self, req):
+        if not self._recv(req, self._rx1, False):
+            return 0
+        count = self._rxbuf[0]
+        if not count or count > SMBusSlave.BLOCK_MAX:
+            req.ack(False)
+            return 0
+        req.ack(True)
+        self._blockbuf[0] = count
+        if self._recv(req, self._blockview[1:1 + count]) != count:
+            return 0
+        if self.tracer:
+            self.tracer.record(tracer.WRITEBLOCK, self.regnr, count)
+        return count
+
+    def _read_block(self, req):
+        count = self._read_block_data(req)
+        if not count:
             return False
-        self._seq_reg_inc()
+        if self._has_commit:
+            self._written(self.regnr)
+        self.writeblock(self.regnr, self._blockview[1:1 + count])
         return True
 
+    # Puts length and data from readblock() into _blockbuf, returns the length
+    def _write_block_data(self):
+        data = self.readblock(self.regnr)
+        count = len(data)
+        if count > SMBusSlave.BLOCK_MAX:
+            raise ValueError('Block is too long')
+        if self.tracer:
+            self.tracer.record(tracer.READBLOCK, self.regnr, count)
+        self._blockbuf[0] = count
+        self._blockview[1:1 + count] = data
+        return count
+
+    def _write_block(self, req):
+        count = self._write_block_data()
+        return req.write(self._blockview[:1 + count]) == 1 + count
+
+    # Reads the PEC byte and ACKs it if it matches
+    def _check_pec(self, req, crc):
+        if self._recv(req, self._rx1, False):
+            if self._rxbuf[0] == crc:
+                req.ack(True)
+                return True
+            req.ack(False)
+        self.pec_errors += 1
+        if self.tracer:
+            self.tracer.record(tracer.PEC_ERROR, self.regnr, crc)
+        return False
+
+    def _read_byte_pec(self, req):
+        if not self._recv(req, self._rx1):
+            return False
+        byte = self._rxbuf[0]
+        if not self._check_pec(req, CRC8_TABLE[self._crc ^ byte]):
+            return False
+        if self._has_commit:
+            self._written(self.regnr)
+        self.writereg(self.regnr, byte)
+        return True
+
+    def _write_byte_pec(self, req):
+        byte = self.readreg(self.regnr)
+        buf = self._txbuf
+        buf[0] = byte
+        buf[1] = CRC8_TABLE[self._crc ^ byte]
+        return req.write(self._tx2) == 2
+
+    def _read_word_pec(self, req):
+        if self._recv(req, self._rx2) != 2:
+            return False
+        word = self._rxbuf
+        lo = word[0]
+        hi = word[1]
+        if not self._check_pec(req, CRC8_TABLE[CRC8_TABLE[self._crc ^ lo] ^ hi]):
+            return False
+        if self._has_commit:
+            self._written(self.regnr)
+        self.writereg(self.regnr, hi << 8 | lo)
+        return True
+
+    def _write_word_pec(self, req):
+        word = self.readreg(self.regnr)
+        buf = self._txbuf
+        buf[0] = word & 0xff
+        buf[1] = word >> 8
+        buf[2] = CRC8_TABLE[CRC8_TABLE[self._crc ^ buf[0]] ^ buf[1]]
+        return req.write(self._tx3) == 3
+
+    # The PEC follows the read part, it's calculated up front including the read address
+    def _read_call_pec(self, req):
+        self._call_valid = False
+        if self._recv(req, self._rx2) != 2:
+            return False
+        word = self._rxbuf
+        crc = CRC8_TABLE[CRC8_TABLE[self._crc ^ word[0]] ^ word[1]]
+        val = self.processcall(self.regnr, word[1] << 8 | word[0])
+        buf = self._callbuf
+        buf[0] = val & 0xff
+        buf[1] = val >> 8
+        crc = CRC8_TABLE[crc ^ (req.address << 1 | 1)]
+        buf[2] = CRC8_TABLE[CRC8_TABLE[crc ^ buf[0]] ^ buf[1]]
+        self._call_valid = True
+        return True
+
+    def _write_call_pec(self, req):
+        if not self._call_valid:
+            return False
+        self._call_valid = False
+        return req.write(self._call3) == 3
+
+    def _read_block_pec(self, req):
+        count = self._read_block_data(req)
+        if not count:
+            return False
+        if not self._check_pec(req, crc8(self._crc, self._blockview[:1 + count])):
+            return False
+        if self._has_commit:
+            self._written(self.regnr)
+        self.writeblock(self.regnr, self._blockview[1:1 + count])
+        return True
+
+    # Block process call: the PEC follows the read part
+    def _read_block_crc(self, req):
+        count = self._read_block_data(req)
+        if not count:
+            return False
+        self._crc = crc8(self._crc, self._blockview[:1 + count])
+        if self._has_commit:
+            self._written(self.regnr)
+        self.writeblock(self.regnr, self._blockview[1:1 + count])
+        return True
+
+    def _write_block_pec(self, req):
+        count = self._write_block_data()
+        self._blockbuf[1 + count] = crc8(self._crc, self._blockview[:1 + count])
+        return req.write(self._blockview[:2 + count]) == 2 + count
+
     def process(self, req):
+        if self.latency is not None:
+            return self._process_timed(req)
+        return self._process(req)
+
+    def _process_timed(self, req):
+        timed = self._timedreq
+        if timed is None:
+            timed = self._timedreq = _TimedRequest(self)
+        timed.start(req)
+        ret = self._process(timed)
+        t3 = monotonic_ns()
+        t1 = timed.t1 or timed.t0
+        t2 = timed.t2 or t3
+        self.latency.add(self._protocol, timed.reg, timed.t0, t1, t2, t3)
+        timed.req = None
+        return ret
+
+    def _process(self, req):
+        reqtype = type(req)
+        if reqtype is not self._reqtype:
+            # Look at the class, hasattr() on the request allocates a bound method
+            self._reqtype = reqtype
+            self._readinto = hasattr(reqtype, 'readinto')
         if not req.is_read:
             if not req.is_restart:
-                cmd = req.read(1, ack=False)
-                if self.debug:
-                    print("process write:", cmd)
-                if not cmd:
+                if self.deadline is not None:
+                    self._t0 = ticks_us()
+                if not self._recv(req, self._rx1, False):
                     return False
-                if not self.command(cmd[0]):
+                cmd = self._rxbuf[0]
+                if self.tracer:
+                    self.tracer.record(tracer.PROCESS_WRITE, cmd)
+                if not self.command(cmd):
                     req.ack(False)
+                    if self.tracer:
+                        self.tracer.record(tracer.NACK, cmd)
                     return False
                 req.ack(True)
+                if self._pec:
+                    self._crc = CRC8_TABLE[CRC8_TABLE[req.address << 1] ^ cmd]
             else:
-                if self.debug:
-                    print("process restart write:")
-
-            if self.debug:
-                print("self.regnr =", self.regnr)
-            if self.protocol == SMBusSlave.SMBUS_BYTE:
-                return self._read_byte(req)
-            elif self.protocol == SMBusSlave.SMBUS_BYTE_SEQ:
-                while True:
-                    if not self._read_byte(req):
-                        return False
-            elif self.protocol == SMBusSlave.SMBUS_WORD:
-                return self._read_word(req)
-            elif self.protocol == SMBusSlave.SMBUS_WORD_SEQ:
-                while True:
-                    if not self._read_word(req):
-                        return False
-            else:
-                raise NotImplementedError
+                if self.tracer:
+                    self.tracer.record(tracer.PROCESS_RESTART_WRITE)
+
+            try:
+                if self.deadline is not None and self._overdue():
+                    return self._abort(req)
+                return self._process_write(req)
+            finally:
+                if self._dirty:
+                    self._commit()
 
         elif req.is_restart:
-            if self.debug:
-                print("process restart read:")
-            if self.protocol == SMBusSlave.SMBUS_BYTE:
-                return self._write_byte(req)
-            elif self.protocol == SMBusSlave.SMBUS_BYTE_SEQ:
-                while True:
-                    if not self._write_byte(req):
-                        return False
-            elif self.protocol == SMBusSlave.SMBUS_WORD:
-                return self._write_word(req)
-            elif self.protocol == SMBusSlave.SMBUS_WORD_SEQ:
-                while True:
-                    if not self._write_word(req):
-                        return False
-            else:
-                raise NotImplementedError
+            if self.tracer:
+                self.tracer.record(tracer.PROCESS_RESTART_READ, self.regnr)
+            if self._pec:
+                self._crc = CRC8_TABLE[self._crc ^ (req.address << 1 | 1)]
+            if self.deadline is not None and self._overdue():
+                return self._abort(req)
+            if self._has_snapshot:
+                self.snapshot(self.regnr)
+            return self._process_read(req)
         else:
-            if self.debug:
-                print("process NOTHING (not write nor restart)")
+            if self.tracer:
+                self.tracer.record(tracer.PROCESS_NOTHING)
             return False
+
+
+# Stands in for the request during a timed process() and stamps the time
+# the command is decoded (ACK/NACK) and the first data byte is transferred.
+class _TimedRequest:
+    __slots__ = ('slave', 'req', 'is_read', 'is_restart', 'address', '_readinto', 'reg',
+                 't0', 't1', 't2')
+
+    def __init__(self, slave):
+        self.slave = slave
+        self.req = None
+
+    def start(self, req):
+        self.req = req
+        self.is_read = req.is_read
+        self.is_restart = req.is_restart
+        self.address = req.address
+        self._readinto = hasattr(req, 'readinto')
+        self.reg = self.slave.regnr
+        self.t1 = 0
+        self.t2 = 0
+        self.t0 = monotonic_ns()
+
+    def ack(self, ack=True):
+        self.req.ack(ack)
+        if not self.t1:
+            self.t1 = monotonic_ns()
+            self.reg = self.slave.regnr
+
+    def read(self, n=-1, ack=True):
+        data = self.req.read(n, ack=ack)
+        if ack and not self.t2:
+            self.t2 = monotonic_ns()
+        return data
+
+    def readinto(self, buf, ack=True):
+        if self._readinto:
+            n = self.req.readinto(buf, ack=ack)
+        else:
+            data = self.req.read(len(buf), ack=ack)
+            n = len(data)
+            if n:
+                buf[:n] = data
+        if ack and not self.t2:
+            self.t2 = monotonic_ns()
+        return n
+
+    def write(self, buf):
+        n = self.req.write(buf)
+        if not self.t2:
+            self.t2 = monotonic_ns()
+        return n
+
+
+# Latency histograms for SMBusSlave.latency
+#
+# Each request is timed from entry to command decoded, to first data byte
+# and to completion. The stages are accumulated per protocol, the total is
+# also accumulated per register along with the worst case.
+class Latency:
+    # Bucket upper limits in microseconds, the last bucket holds the rest
+    BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+    DECODE, FIRST, TOTAL = range(3)
+
+    def __init__(self, num_regs, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.num_regs = num_regs
+        size = len(self.buckets) + 1
+        self._protocols = [array('L', [0] * (3 * size)) for _ in range(8)]
+        self._registers = [array('L', [0] * size) for _ in range(num_regs)]
+        self._max = array('L', [0] * num_regs)
+
+    def _bucket(self, us):
+        i = 0
+        for limit in self.buckets:
+            if us <= limit:
+                return i
+            i += 1
+        return i
+
+    def add(self, protocol, reg, t0, t1, t2, t3):
+        size = len(self.buckets) + 1
+        hist = self._protocols[protocol]
+        hist[self._bucket((t1 - t0) // 1000)] += 1
+        hist[size + self._bucket((t2 - t0) // 1000)] += 1
+        total = (t3 - t0) // 1000
+        hist[2 * size + self._bucket(total)] += 1
+        if reg < self.num_regs:
+            self._registers[reg][self._bucket(total)] += 1
+            if total > self._max[reg]:
+                self._max[reg] = total
+
+    # Returns a list of counts per bucket
+    def protocol(self, protocol, stage=TOTAL):
+        size = len(self.buckets) + 1
+        return list(self._protocols[protocol][stage * size:(stage + 1) * size])
+
+    # Returns a list of counts per bucket for the total time
+    def register(self, reg):
+        return list(self._registers[reg])
+
+    # Worst case total time in microseconds
+    def max(self, reg):
+        return self._max[reg]
+
+    def reset(self):
+        for hist in self._protocols + self._registers + [self._max]:
+            for i in range(len(hist)):
+                hist[i] = 0
+
+
+class Register:
+    __slots__ = ('value', 'rmask', 'wmask', 'readonly', 'read', 'write')
+
+    def __init__(self, value=0, rmask=None, wmask=None, readonly=False, read=None, write=None):
+        self.value = value
+        self.rmask = rmask
+        self.wmask = wmask
+        self.readonly = readonly
+        self.read = read    # read(reg) returns the value
+        self.write = write  # write(reg, val) is responsible for storing the value
+
+
+# Register file backed by a bytearray (width=8) or array('H') (width=16).
+# The Register hooks and masks are resolved into index-addressed tables at
+# construction, a register without one has None and is served straight from regs.
+class RegisterMap:
+    __slots__ = ('regs', 'mask', '_read', '_write')
+
+    def __init__(self, size, registers=None, width=8):
+        if width == 8:
+            self.regs = bytearray(size)
+            self.mask = 0xff
+        elif width == 16:
+            self.regs = array('H', bytes(size * 2))
+            self.mask = 0xffff
+        else:
+            raise ValueError('width must be 8 or 16')
+        self._read = [None] * size
+        self._write = [None] * size
+        if registers:
+            for reg, r in registers.items():
+                self.regs[reg] = r.value
+                self._read[reg] = self._resolve_read(r)
+                self._write[reg] = self._resolve_write(r)
+
+    def __len__(self):
+        return len(self.regs)
+
+    def _resolve_read(self, r):
+        rmask = r.rmask
+        if rmask is None or rmask == self.mask:
+            return r.read
+        hook = r.read
+        regs = self.regs
+        if hook is None:
+            return lambda reg: regs[reg] & rmask
+        return lambda reg: hook(reg) & rmask
+
+    def _resolve_write(self, r):
+        if r.readonly:
+            return self._ignore
+        wmask = r.wmask
+        if wmask is None or wmask == self.mask:
+            return r.write
+        hook = r.write
+        regs = self.regs
+        keep = ~wmask & self.mask
+
+        def write(reg, val):
+            val = (regs[reg] & keep) | (val & wmask)
+            if hook is None:
+                regs[reg] = val
+            else:
+                hook(reg, val)
+        return write
+
+    def _ignore(self, reg, val):
+        pass
+
+    def read(self, reg):
+        hook = self._read[reg]
+        if hook is None:
+            return self.regs[reg]
+        return hook(reg)
+
+    def write(self, reg, val):
+        hook = self._write[reg]
+        if hook is None:
+            self.regs[reg] = val
+        else:
+            hook(reg, val)
+
+    # buf holds bytes, or little endian words with width=16 like SMBusSlave.writeregs
+    def writeregs(self, start, buf):
+        reg = start
+        last = len(self.regs) - 1
+        if self.mask == 0xff:
+            for val in buf:
+                self.write(reg, val)
+                reg = reg + 1 if reg < last else 0
+        else:
+            for i in range(0, len(buf) - 1, 2):
+                self.write(reg, buf[i] | buf[i + 1] << 8)
+                reg = reg + 1 if reg < last else 0
@@ -0,0 +1,68 @@
+import os
+import sys
+
+# These tests run the device models under CPython, no board needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import i2cslavemock
+i2cslavemock.install()  # digitalio, pulseio and rtc stand-ins
+
+import pytest
+from array import array
+from i2cslavemock import I2CSlave, I2CMaster
+from smbusslave import SMBusSlave
+
+ADDRESS = 0x41
+
+
+# SMBusSlave with the registers in an array('H') and the blocks in a list.
+# processcall() records the call in calls and returns the value inverted.
+class ArraySlave(SMBusSlave):
+    def __init__(self, protocol, max_reg=7, regs=None, pec=False):
+        super().__init__()
+        self.protocol = protocol
+        self.pec = pec
+        self.max_reg = max_reg
+        self.regs = array('H', regs if regs is not None else [0] * (max_reg + 1))
+        self.blocks = [b'\x00'] * (max_reg + 1)
+        self.calls = []
+
+    def readreg(self, reg):
+        return self.regs[reg]
+
+    def writereg(self, reg, val):
+        self.regs[reg] = val
+
+    def processcall(self, reg, val):
+        self.calls.append((reg, val))
+        return ~val & 0xffff
+
+    def readblock(self, reg):
+        return self.blocks[reg]
+
+    def writeblock(self, reg, buf):
+        self.blocks[reg] = bytes(buf)
+
+
+@pytest.fixture
+def address():
+    return ADDRESS
+
+
+# smbus_slave(protocol, *mixins, **kwargs) returns an ArraySlave, the mixin
+# classes go in front of it so they can add hooks like commit() or override methods.
+@pytest.fixture
+def smbus_slave():
+    def make(protocol, *mixins, **kwargs):
+        cls = type('Slave', mixins + (ArraySlave,), {}) if mixins else ArraySlave
+        return cls(protocol, **kwargs)
+    return make
+
+
+# smbus(protocol, *mixins, **kwargs) returns the slave and a bus serving it on ADDRESS
+@pytest.fixture
+def smbus(smbus_slave):
+    def make(protocol, *mixins, **kwargs):
+        slave = smbus_slave(protocol, *mixins, **kwargs)
+        return slave, I2CMaster(I2CSlave(None, None, (ADDRESS,)), slave.process)
+    return make
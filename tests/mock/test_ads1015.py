@@ -0,0 +1,42 @@
+import pytest
+from i2cslavemock import I2CSlave, I2CMaster
+from ads1015slave import ADS1015Slave, CONVERSION, CONFIG, LO_THRESH
+
+address = 0x48
+
+
+class AnalogIn:
+    def __init__(self, value):
+        self.value = value
+
+
+def swap(val):
+    return ((val >> 8) | (val << 8)) & 0xffff
+
+
+@pytest.fixture
+def ads1015():
+    adcs = [AnalogIn(0x1000), AnalogIn(0x2000), AnalogIn(0x4000), AnalogIn(0xfff0)]
+    ads = ADS1015Slave(adcs)
+    return ads, I2CMaster(I2CSlave(None, None, (address,)), ads.process)
+
+
+def test_config_reset(ads1015):
+    ads, bus = ads1015
+    assert swap(bus.read_word_data(address, CONFIG)) == 0x8583
+
+
+@pytest.mark.parametrize('index', range(4))
+def test_conversion(ads1015, index):
+    ads, bus = ads1015
+    config = 0x8583 & ~(0b111 << 12) | (0b100 | index) << 12
+    bus.write_word_data(address, CONFIG, swap(config))
+    assert ads.index == index
+    val = swap(bus.read_word_data(address, CONVERSION))
+    assert val == ads.adcs[index].value >> 1
+
+
+def test_thresh_lsbs(ads1015):
+    ads, bus = ads1015
+    bus.write_word_data(address, LO_THRESH, swap(0x123f))
+    assert swap(bus.read_word_data(address, LO_THRESH)) == 0x1230
@@ -0,0 +1,116 @@
+import tracemalloc
+import pytest
+from smbusslave import SMBusSlave
+
+
+# The measurement covers everything allocated while process() runs, including
+# the transient objects. So the request itself mustn't allocate and the values
+# are kept below 256 since CPython allocates bigger ints, MicroPython doesn't.
+# The bulk (readregs/writeregs) and block paths slice memoryviews which does
+# allocate on MicroPython, they're not covered.
+
+class Request:
+    """I2CSlaveRequest with readinto() that doesn't allocate"""
+    def __init__(self, address, is_read, is_restart, data=b'', n=0):
+        self.address = address
+        self.is_read = is_read
+        self.is_restart = is_restart
+        self.data = data
+        self.pos = 0
+        self.n = n
+
+    def readinto(self, buf, ack=True):
+        n = len(self.data) - self.pos
+        if n > len(buf):
+            n = len(buf)
+        i = 0
+        while i < n:
+            buf[i] = self.data[self.pos + i]
+            i += 1
+        self.pos += n
+        return n
+
+    def read(self, n=-1, ack=True):
+        raise AssertionError('read() allocates, readinto() should be used')
+
+    def ack(self, ack=True):
+        pass
+
+    def write(self, buf):
+        n = len(buf) if len(buf) < self.n else self.n
+        self.n -= n
+        return n
+
+
+# The hooks are called on every transaction
+class Hooks:
+    def snapshot(self, reg):
+        pass
+
+    def commit(self, changed):
+        pass
+
+
+def allocated(func):
+    """Return the peak number of bytes allocated while func() runs, freed or not"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+protocols = [
+    (SMBusSlave.SMBUS_BYTE, 1),
+    (SMBusSlave.SMBUS_BYTE_SEQ, 1),
+    (SMBusSlave.SMBUS_WORD, 2),
+    (SMBusSlave.SMBUS_WORD_SEQ, 2),
+]
+protocol_ids = ['BYTE', 'BYTE_SEQ', 'WORD', 'WORD_SEQ']
+
+
+@pytest.mark.parametrize('protocol, width', protocols, ids=protocol_ids)
+@pytest.mark.parametrize('pec', [False, True], ids=['', 'PEC'])
+@pytest.mark.parametrize('mixins', [(), (Hooks,)], ids=['', 'hooks'])
+def test_read_allocations(smbus_slave, address, protocol, width, pec, mixins):
+    slave = smbus_slave(protocol, *mixins, max_reg=63, regs=range(64))
+    if pec:
+        if protocol not in (SMBusSlave.SMBUS_BYTE, SMBusSlave.SMBUS_WORD):
+            pytest.skip('PEC is not supported by the sequential protocols')
+        slave.pec = True
+    reqs = []
+    for _ in range(10):
+        reqs.append(Request(address, False, False, b'\x10'))
+        reqs.append(Request(address, True, True, n=32 * width))
+
+    def run():
+        i = 0  # A for loop would allocate an iterator
+        while i < len(reqs):
+            slave.process(reqs[i])
+            i += 1
+
+    slave.process(Request(address, False, False, b'\x10'))  # Warm up
+    assert allocated(run) == 0
+    assert reqs[-1].n == 0 or protocol in (SMBusSlave.SMBUS_BYTE, SMBusSlave.SMBUS_WORD)
+
+
+@pytest.mark.parametrize('protocol, width', protocols, ids=protocol_ids)
+@pytest.mark.parametrize('mixins', [(), (Hooks,)], ids=['', 'hooks'])
+def test_write_allocations(smbus_slave, address, protocol, width, mixins):
+    slave = smbus_slave(protocol, *mixins, max_reg=63, regs=range(64))
+    data = bytes(range(1 + 32)) if width == 1 else bytes([0] + [1, 0] * 32)
+    reqs = [Request(address, False, False, data) for _ in range(10)]
+
+    def run():
+        i = 0  # A for loop would allocate an iterator
+        while i < len(reqs):
+            slave.process(reqs[i])
+            i += 1
+
+    slave.process(Request(address, False, False, b'\x00'))  # Warm up
+    assert allocated(run) == 0
+    assert slave.regs[0] == 0x01
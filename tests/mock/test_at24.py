@@ -0,0 +1,260 @@
+import errno
+import io
+import time
+import pytest
+from i2cslavemock import I2CSlave, I2CMaster
+import at24slave
+import ticks
+from at24slave import AT24Slave
+
+address = 0x50
+
+
+def contents(at24):
+    if at24.mem is not None:
+        return bytes(at24.mem)
+    return at24.file.getvalue()
+
+
+@pytest.fixture(params=['file', 'bytearray'])
+def eeprom(request):
+    if request.param == 'file':
+        at24 = AT24Slave(io.BytesIO(bytes(128)))
+    else:
+        at24 = AT24Slave(bytearray(128))
+    return at24, I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+
+
+@pytest.mark.parametrize('pos, data', [(0, [0x01]), (16, list(range(8))), (120, [0xa5] * 8)])
+def test_eeprom(eeprom, pos, data):
+    at24, bus = eeprom
+    bus.write(address, [pos] + data)
+    assert bus.write_read(address, [pos], len(data)) == data
+    assert contents(at24)[pos:pos + len(data)] == bytes(data)
+
+
+def test_eeprom_128(eeprom):
+    at24, bus = eeprom
+    data = list(range(128))
+    for pos in range(0, 128, 8):
+        bus.write(address, [pos] + data[pos:pos + 8])
+    assert bus.write_read(address, [0], 128) == data
+
+
+def test_address_nack(eeprom):
+    at24, bus = eeprom
+    with pytest.raises(OSError):
+        bus.write(address, [0x81, 0x00])
+
+
+def test_mem_wraparound():
+    at24 = AT24Slave(bytearray(range(128)))
+    bus = I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+    assert bus.write_read(address, [120], 16) == list(range(120, 128)) + list(range(8))
+    # Current address read continues where the last one stopped
+    assert bus.read(address, 2) == [8, 9]
+    assert bus.write_read(address, [0], 300) == (list(range(128)) * 3)[:300]
+
+
+# Writes roll over to the start of the page and are stored once per request
+@pytest.mark.parametrize('mode', ['file', 'bytearray'])
+def test_page_rollover(mode):
+    class File(io.BytesIO):
+        writes = 0
+
+        def write(self, b):
+            File.writes += 1
+            return super().write(b)
+
+    image = bytes(range(128))
+    at24 = AT24Slave(File(image) if mode == 'file' else bytearray(image))
+    bus = I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+    bus.write(address, [126, 0xaa, 0xbb, 0xcc])
+    assert contents(at24)[120:128] == bytes([0xcc, 121, 122, 123, 124, 125, 0xaa, 0xbb])
+    assert at24.addr == 121
+    # More than a page: only the last 8 bytes survive
+    bus.write(address, [3] + list(range(0x10, 0x1a)))
+    assert contents(at24)[:8] == bytes([0x15, 0x16, 0x17, 0x18, 0x19, 0x12, 0x13, 0x14])
+    if mode == 'file':
+        assert File.writes == 2
+
+
+def test_default_geometry():
+    assert AT24Slave(bytearray(128)).geometry is at24slave.AT24C01
+    assert AT24Slave(bytearray(200)).geometry is at24slave.AT24C02
+    assert AT24Slave(bytearray(4096)).geometry is at24slave.AT24C32
+    with pytest.raises(ValueError):
+        AT24Slave(bytearray(1024), at24slave.AT24C02)
+
+
+@pytest.mark.parametrize('mode', ['file', 'bytearray'])
+def test_16bit_address(mode):
+    image = bytes(range(256)) * 16
+    at24 = AT24Slave(io.BytesIO(image) if mode == 'file' else bytearray(image), at24slave.AT24C32)
+    bus = I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+    assert bus.write_read(address, [0x0f, 0xfe], 4) == [0xfe, 0xff, 0x00, 0x01]
+    # Stream the full address space and wrap around
+    assert bytes(bus.write_read(address, [0x00, 0x10], 4096)) == image[0x10:] + image[:0x10]
+    bus.write(address, [0x0a, 0x00] + [0x55] * 32)
+    assert contents(at24)[0xa00:0xa20] == b'\x55' * 32
+    with pytest.raises(OSError):
+        bus.write(address, [0x10, 0x00])
+
+
+# 24C04: the LSB of the I2C address selects the upper half
+def test_block_address():
+    at24 = AT24Slave(bytearray(512), at24slave.AT24C04)
+    bus = I2CMaster(I2CSlave(None, None, (address, address + 1)), at24.process)
+    bus.write(address + 1, [0x10, 0x42])
+    assert at24.mem[0x110] == 0x42
+    assert bus.write_read(address + 1, [0x10], 1) == [0x42]
+    assert bus.write_read(address, [0x10], 1) == [0x00]
+
+
+class CountingFile(io.BytesIO):
+    def __init__(self, initial_bytes):
+        super().__init__(initial_bytes)
+        self.writes = []
+
+    def write(self, b):
+        self.writes.append((self.tell(), len(b)))
+        return super().write(b)
+
+
+def cached_eeprom():
+    file = CountingFile(bytes(256))
+    at24 = AT24Slave(file, cache=True)
+    return at24, file, I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+
+
+def test_cache():
+    at24, file, bus = cached_eeprom()
+    bus.write(address, [0x10, 1, 2])
+    bus.write(address, [0x12, 3, 4])
+    bus.write(address, [0x18, 5])
+    bus.write(address, [0x80, 6])
+    assert file.writes == []
+    assert bus.write_read(address, [0x10], 3) == [1, 2, 3]
+    assert at24.dirty_pages == 3
+    # Repeated writes to a page are coalesced, so are consecutive pages
+    assert at24.flush() == 3
+    assert file.writes == [(0x10, 16), (0x80, 8)]
+    assert file.getvalue()[0x10:0x19] == bytes([1, 2, 3, 4, 0, 0, 0, 0, 5])
+    assert at24.flush() == 0
+
+
+def test_cache_idle():
+    at24, file, bus = cached_eeprom()
+    bus.write(address, [0x00, 1])
+    at24.idle()
+    assert file.writes == []
+    at24.flush_delay = 0
+    at24.idle()
+    assert file.writes == [(0, 8)]
+
+
+# idle() writes flush_pages pages per call so the scheduler slice stays short
+def test_cache_idle_slice():
+    at24, file, bus = cached_eeprom()
+    at24.flush_delay = 0
+    for pos in range(0, 32, 8):
+        bus.write(address, [pos, pos])
+    for left in (3, 2, 1, 0):
+        at24.idle()
+        assert at24.dirty_pages == left
+    assert file.writes == [(0, 8), (8, 8), (16, 8), (24, 8)]
+    at24.flush_pages = 2
+    bus.write(address, [0x00, 1, 2, 3, 4, 5, 6, 7, 8])
+    bus.write(address, [0x10, 1])
+    bus.write(address, [0x20, 1])
+    at24.idle()
+    assert at24.dirty_pages == 1
+
+
+def test_cache_max_age():
+    at24, file, bus = cached_eeprom()
+    at24.max_age = 0
+    bus.write(address, [0x00, 1])
+    at24.idle()
+    assert file.writes == [(0, 8)]
+
+
+def test_cache_sync():
+    at24, file, bus = cached_eeprom()
+    for pos in range(0, 256, 8):
+        bus.write(address, [pos, pos])
+    assert at24.flush(max_pages=4) == 4
+    assert at24.dirty_pages == 28
+    at24.sync()
+    assert at24.dirty_pages == 0
+    assert file.getvalue()[::8] == bytes(range(0, 256, 8))
+
+
+# The at24 driver polls with the write until it gets an ACK
+def write_poll(bus, at24, data):
+    for retries in range(100):
+        try:
+            bus.write(address, data)
+            return retries
+        except OSError as e:
+            assert e.errno == errno.EREMOTEIO
+        at24.idle()
+        time.sleep(0.001)
+    raise AssertionError('Still busy')
+
+
+def write_cycle_eeprom():
+    file = CountingFile(bytes(128))
+    at24 = AT24Slave(file)
+    at24.write_cycle = 5
+    return at24, file, I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+
+
+def test_write_cycle():
+    at24, file, bus = write_cycle_eeprom()
+    bus.write(address, [0x08, 1, 2, 3])
+    assert at24.busy
+    assert file.writes == []
+    with pytest.raises(OSError):
+        bus.write_read(address, [0x08], 3)
+    retries = write_poll(bus, at24, [0x10, 4])
+    assert retries > 0
+    assert at24.busy_nacks > retries
+    assert file.writes == [(0x08, 8)]
+    write_poll(bus, at24, [0x08])
+    assert bus.read(address, 3) == [1, 2, 3]
+    at24.sync()
+    assert not at24.busy
+    assert file.getvalue()[0x10] == 4
+
+
+# Requests never store the page, without idle() the device stays busy until sync()
+def test_write_cycle_no_idle():
+    at24, file, bus = write_cycle_eeprom()
+    bus.write(address, [0x08, 1])
+    time.sleep(0.01)
+    with pytest.raises(OSError):
+        bus.write(address, [0x10, 2])
+    assert file.writes == []
+    at24.sync()
+    assert file.writes == [(0x08, 8)]
+    bus.write(address, [0x10, 2])
+
+
+# A write cycle that started more than half a ticks period ago is over
+def test_write_cycle_ticks_wrap(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(at24slave, 'ticks_us', lambda: now[0])
+    file = CountingFile(bytes(128))
+    at24 = AT24Slave(file)
+    at24.write_cycle = 5
+    bus = I2CMaster(I2CSlave(None, None, (address,)), at24.process)
+
+    bus.write(address, [0x08, 1])
+    now[0] = 4000
+    at24.idle()
+    assert at24.busy
+    now[0] = ticks._TICKS_PERIOD // 2 + 1000
+    at24.idle()
+    assert not at24.busy
+    assert file.writes == [(0x08, 8)]
@@ -0,0 +1,45 @@
+import errno
+import pytest
+from smbusslave import SMBusSlave
+
+@pytest.fixture
+def block_bus(smbus):
+    return smbus(SMBusSlave.SMBUS_BLOCK, max_reg=3)
+
+
+@pytest.mark.parametrize('data', [[0x55], list(range(1, 17)), list(range(32))], ids=['1', '16', '32'])
+def test_roundtrip(block_bus, address, data):
+    slave, bus = block_bus
+    bus.write_block_data(address, 2, data)
+    assert slave.blocks[2] == bytes(data)
+    assert bus.read_block_data(address, 2) == data
+
+
+def test_length_byte(block_bus, address):
+    slave, bus = block_bus
+    slave.blocks[1] = b'\x11\x22\x33'
+    data = bus.read_i2c_block_data(address, 1, 6)
+    assert data == [3, 0x11, 0x22, 0x33, 0xff, 0xff]
+
+
+@pytest.mark.parametrize('count', [0, 33])
+def test_bad_length(block_bus, address, count):
+    slave, bus = block_bus
+    with pytest.raises(OSError) as excinfo:
+        bus.write(address, [1, count] + [0x55] * count)
+    assert excinfo.value.errno == errno.EREMOTEIO
+    assert slave.blocks[1] == b'\x00'
+
+
+# The master stops early, the block isn't written
+def test_short_write(block_bus, address):
+    slave, bus = block_bus
+    bus.write(address, [1, 4, 0x55, 0x66])
+    assert slave.blocks[1] == b'\x00'
+
+
+def test_readblock_too_long(block_bus, address):
+    slave, bus = block_bus
+    slave.blocks[0] = bytes(SMBusSlave.BLOCK_MAX + 1)
+    with pytest.raises(ValueError):
+        bus.read_block_data(address, 0)
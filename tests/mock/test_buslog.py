@@ -0,0 +1,175 @@
+import io
+import pytest
+import buslog
+from buslog import Recorder, Replayer
+from i2cslavemock import I2CSlave, I2CMaster
+from at24slave import AT24Slave
+from smbusslave import SMBusSlave
+from mcp23008slave import MCP23008Slave, IODIR, IPOL, GPIO, OLAT
+
+
+def record(device, address, func):
+    log = io.BytesIO()
+    recorder = Recorder(device, log)
+    func(I2CMaster(I2CSlave(None, None, (address,)), recorder.process))
+    recorder.flush()
+    log.seek(0)
+    return log, recorder
+
+
+def test_records():
+    def traffic(bus):
+        bus.write(0x50, [0x10, 1, 2, 3])
+        bus.write_read(0x50, [0x10], 3)
+        with pytest.raises(OSError):
+            bus.write(0x50, [0x90])
+
+    log, recorder = record(AT24Slave(io.BytesIO(bytes(128))), 0x50, traffic)
+    records = list(buslog.records(log))
+    assert recorder.records == len(records) == 4
+    assert [(r.is_read, r.is_restart, r.nack, r.data) for r in records] == [
+        (False, False, False, b'\x10\x01\x02\x03'),
+        (False, False, False, b'\x10'),
+        (True, True, False, b'\x01\x02\x03'),
+        (False, False, True, b'\x90'),
+    ]
+    assert all(r.address == 0x50 for r in records)
+    assert [r.time for r in records] == sorted(r.time for r in records)
+
+
+def test_replay_at24():
+    def traffic(bus):
+        bus.write(0x50, [0x00] + list(range(16)))
+        bus.write_read(0x50, [0x04], 8)
+        with pytest.raises(OSError):
+            bus.write(0x50, [0x90])
+
+    log, _ = record(AT24Slave(io.BytesIO(bytes(128))), 0x50, traffic)
+    replayer = Replayer(log)
+    assert replayer.run(AT24Slave(io.BytesIO(bytes(128))).process) == 0
+    assert replayer.transactions == 4
+
+
+def test_replay_mcp23008():
+    def traffic(bus):
+        bus.write_byte_data(0x20, IODIR, 0xf0)
+        bus.write_byte_data(0x20, GPIO, 0x05)
+        bus.read_byte_data(0x20, OLAT)
+        bus.read_i2c_block_data(0x20, IODIR, 11)
+        with pytest.raises(OSError):
+            bus.read_byte_data(0x20, 0x20)
+
+    log, _ = record(MCP23008Slave(['D0']), 0x20, traffic)
+    assert Replayer(log).run(MCP23008Slave(['D0']).process) == 0
+
+    # A device that has drifted from the recording
+    log.seek(0)
+    mcp = MCP23008Slave(['D0'])
+    mcp.regs[IPOL] = 0x01
+    replayer = Replayer(log)
+    assert replayer.run(mcp.process) == 1
+    index, rec, data = replayer.errors[0]
+    assert index == 5
+    assert data[IPOL] == 0x01 and rec.data[IPOL] == 0x00
+
+
+# The records hold ticks_us() differences, records() turns them into times since the start
+def test_times(monkeypatch):
+    now = [1000]
+    monkeypatch.setattr(buslog, 'ticks_us', lambda: now[0])
+
+    class Device:
+        def process(self, req):
+            now[0] += 7
+
+    log = io.BytesIO()
+    recorder = Recorder(Device(), log)
+    for start in (1500, 4000, 4100):
+        now[0] = start
+        recorder.process(ReadintoRequest(b''))
+    recorder.flush()
+    log.seek(0)
+    assert [(r.time, r.duration) for r in buslog.records(log)] == [(500, 7), (3000, 7), (3100, 7)]
+
+
+def test_not_a_log():
+    with pytest.raises(ValueError):
+        list(buslog.records(io.BytesIO(b'nope')))
+
+
+# Nothing is written to the file inside the transaction
+def test_flush():
+    log = io.BytesIO()
+    recorder = Recorder(AT24Slave(io.BytesIO(bytes(128))), log)
+    bus = I2CMaster(I2CSlave(None, None, (0x50,)), recorder.process)
+    bus.write(0x50, [0x10, 1, 2, 3])
+    assert log.getvalue() == buslog.HEADER
+    assert recorder.flush() == buslog.RECORD_SIZE + 4
+    assert recorder.flush() == 0
+    bus.write_read(0x50, [0x10], 3)
+    recorder.flush()
+    log.seek(0)
+    assert [r.data for r in buslog.records(log)] == [b'\x10\x01\x02\x03', b'\x10', b'\x01\x02\x03']
+
+
+# The records wrap around the end of the ring, those that don't fit are dropped
+def test_ring():
+    log = io.BytesIO()
+    recorder = Recorder(AT24Slave(io.BytesIO(bytes(128))), log, size=3 * buslog.RECORD_SIZE)
+    bus = I2CMaster(I2CSlave(None, None, (0x50,)), recorder.process)
+    expected = []
+    for i in range(5):
+        data = [i, i + 1]
+        bus.write(0x50, data)
+        expected.append(bytes(data))
+        recorder.flush()
+    bus.write(0x50, [0x20] + [0x55] * 8)
+    bus.write(0x50, [0x30])
+    expected += [b'\x20' + b'\x55' * 8, b'\x30']
+    bus.write(0x50, [0x40])  # Full
+    bus.write(0x50, [0x50])
+    recorder.flush()
+    bus.write(0x50, [0x60])
+    expected.append(b'\x60')
+    recorder.flush()
+    assert recorder.records == 8
+    assert recorder.dropped == 2
+    log.seek(0)
+    assert [r.data for r in buslog.records(log)] == expected
+
+
+class ReadintoRequest:
+    address = 0x41
+    is_read = False
+    is_restart = False
+
+    def __init__(self, data):
+        self.data = data
+        self.readintos = 0
+
+    def readinto(self, buf, ack=True):
+        self.readintos += 1
+        n = min(len(buf), len(self.data))
+        buf[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+    def read(self, n=-1, ack=True):
+        raise AssertionError('readinto() should be used')
+
+    def ack(self, ack=True):
+        pass
+
+
+# SMBusSlave uses readinto() when the request has it
+def test_readinto(smbus_slave):
+    log = io.BytesIO()
+    slave = smbus_slave(SMBusSlave.SMBUS_BYTE)
+    recorder = Recorder(slave, log)
+    req = ReadintoRequest(b'\x03\x42')
+    recorder.process(req)
+    assert req.readintos == 2
+    assert slave.regs[3] == 0x42
+    recorder.flush()
+    log.seek(0)
+    assert [r.data for r in buslog.records(log)] == [b'\x03\x42']
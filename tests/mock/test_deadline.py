@@ -0,0 +1,73 @@
+import errno
+import pytest
+import smbusslave
+from smbusslave import SMBusSlave
+
+
+# Every register access advances the fake ticks_us() clock by delay microseconds
+class Slow:
+    delay = 0
+
+    def readreg(self, reg):
+        self.clock[0] += self.delay
+        return super().readreg(reg)
+
+    def writereg(self, reg, val):
+        self.clock[0] += self.delay
+        super().writereg(reg, val)
+
+
+@pytest.fixture
+def slow_bus(smbus, monkeypatch):
+    clock = [0]
+    monkeypatch.setattr(smbusslave, 'ticks_us', lambda: clock[0])
+
+    def make(protocol, delay):
+        slave, bus = smbus(protocol, Slow, regs=range(0x10, 0x18))
+        slave.clock = clock
+        slave.delay = delay
+        slave.deadline = 3000
+        return slave, bus
+    return make
+
+
+# 8 registers take 2.4 ms of the 3 ms budget
+def test_in_time(slow_bus, address):
+    slave, bus = slow_bus(SMBusSlave.SMBUS_BYTE_SEQ, 300)
+    assert bus.read_i2c_block_data(address, 0, 8) == list(range(0x10, 0x18))
+    bus.write_i2c_block_data(address, 0, [1, 2, 3, 4])
+    assert slave.deadline_misses == 0
+
+
+# The deadline is checked every DEADLINE_INTERVAL registers
+interval = SMBusSlave.DEADLINE_INTERVAL
+
+
+def test_read_fallback(slow_bus, address):
+    slave, bus = slow_bus(SMBusSlave.SMBUS_BYTE_SEQ, 1000)
+    data = bus.read_i2c_block_data(address, 0, interval + 4)
+    assert data[:interval] == list(range(0x10, 0x18))
+    assert data[interval:] == [0xff] * 4
+    assert slave.deadline_misses == 1
+
+
+def test_word_read_fallback(slow_bus, address):
+    slave, bus = slow_bus(SMBusSlave.SMBUS_WORD_SEQ, 1000)
+    data = bus.read_i2c_block_data(address, 0, 2 * interval + 4)
+    assert data[:2] == [0x10, 0x00]
+    assert data[2 * interval:] == [0xff] * 4
+    assert slave.deadline_misses == 1
+
+
+def test_write_nack(slow_bus, address):
+    slave, bus = slow_bus(SMBusSlave.SMBUS_BYTE_SEQ, 1000)
+    with pytest.raises(OSError) as e:
+        bus.write_i2c_block_data(address, 0, list(range(1, interval + 3)))
+    assert e.value.errno == errno.EREMOTEIO
+    assert list(slave.regs) == list(range(1, interval + 1))
+    assert slave.deadline_misses == 1
+
+    # The next transaction gets a new budget
+    slave.delay = 0
+    bus.write_byte_data(address, 3, 0x42)
+    assert bus.read_byte_data(address, 3) == 0x42
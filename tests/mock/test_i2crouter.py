@@ -0,0 +1,92 @@
+import errno
+import pytest
+from i2cslavemock import I2CSlave, I2CMaster
+from i2crouter import I2CRouter
+
+
+class Device:
+    def __init__(self):
+        self.requests = []
+
+    def process(self, req):
+        self.requests.append(req.address)
+        if req.is_read:
+            req.write(b'\x42')
+        else:
+            req.read()
+
+
+@pytest.fixture
+def router():
+    slave = I2CSlave(None, None, (0x20, 0x50, 0x68))
+    router = I2CRouter(slave)
+    return router, I2CMaster(slave)
+
+
+def run(router, transfer):
+    while router.poll():
+        pass
+    if transfer.error:
+        raise transfer.error
+
+
+def test_add_remove(router):
+    router, bus = router
+    dev = Device()
+    router.add(0x20, dev)
+    assert router.devices[0x20] is dev
+    with pytest.raises(ValueError):
+        router.add(0x20, Device())
+    with pytest.raises(ValueError):
+        router.add(0x80, Device())
+    assert router.remove(0x20) is dev
+    assert router.devices[0x20] is None
+    router.add(0x20, Device())
+
+
+def test_dispatch(router):
+    router, bus = router
+    devs = {0x20: Device(), 0x50: Device()}
+    for address, dev in devs.items():
+        router.add(address, dev)
+    msgs = [bus.Message([1, 2]), bus.Message([0], read=True)]
+    run(router, bus.transfer(0x50, msgs))
+    assert msgs[1].data == [0x42]
+    run(router, bus.transfer(0x20, [bus.Message([3])]))
+    assert devs[0x50].requests == [0x50, 0x50]
+    assert devs[0x20].requests == [0x20]
+    assert router.unclaimed == 0
+
+
+# The master sees a NACK when writing to an address without a device
+def test_unclaimed_write(router):
+    router, bus = router
+    with pytest.raises(OSError) as excinfo:
+        run(router, bus.transfer(0x68, [bus.Message([1, 2])]))
+    assert excinfo.value.errno == errno.EREMOTEIO
+    assert router.unclaimed == 1
+    assert router.errors == 0
+
+
+def test_unclaimed_read(router):
+    router, bus = router
+    msgs = [bus.Message([0, 0], read=True)]
+    run(router, bus.transfer(0x68, msgs))
+    assert msgs[0].data == [0xff, 0xff]
+    assert router.unclaimed == 1
+    assert router.errors == 0
+
+
+def test_error(router, capsys):
+    class Broken:
+        def process(self, req):
+            raise OSError(errno.EIO, 'Broken')
+
+    router, bus = router
+    router.add(0x20, Broken())
+    bus.transfer(0x20, [bus.Message([1])])
+    assert not router.poll()
+    assert router.errors == 1
+    assert 'ERROR:' in capsys.readouterr().out
+    assert not router.poll()
+    assert router.errors == 1
@@ -0,0 +1,56 @@
+import errno
+import pytest
+from i2cslavemock import I2CSlave, I2CMaster, Message
+
+
+def test_address_nack():
+    slave = I2CSlave(None, None, (0x40,))
+    master = I2CMaster(slave, lambda req: None)
+    with pytest.raises(OSError) as e:
+        master.read(0x41, 1)
+    assert e.value.errno == errno.ENXIO
+
+
+def test_request_loop():
+    slave = I2CSlave(None, None, (0x40,))
+    assert slave.request() is None
+    msgs = [Message([0x01, 0x02]), Message([0, 0, 0], read=True)]
+    transfer = I2CMaster(slave).transfer(0x40, msgs)
+
+    with slave.request() as r:
+        assert r.address == 0x40
+        assert not r.is_read and not r.is_restart
+        assert r.read(1) == b'\x01'
+        assert r.read() == b'\x02'
+        assert r.read() == b''
+
+    with slave.request() as r:
+        assert r.is_read and r.is_restart
+        assert r.write(b'\xaa\xbb') == 2
+        assert r.write(b'\xcc\xdd') == 1
+        assert r.write(b'\xee') == 0
+
+    assert slave.request() is None
+    assert transfer.done and transfer.error is None
+    assert msgs[1].data == [0xaa, 0xbb, 0xcc]
+
+
+def test_nack_aborts_transfer():
+    def handler(req):
+        req.read(1, ack=False)
+        req.ack(False)
+        handled.append(req)
+
+    handled = []
+    slave = I2CSlave(None, None, (0x40,))
+    master = I2CMaster(slave, handler)
+    with pytest.raises(OSError) as e:
+        master.write_read(0x40, [0x09], 1)
+    assert e.value.errno == errno.EREMOTEIO
+    assert len(handled) == 1
+
+
+def test_short_read():
+    slave = I2CSlave(None, None, (0x40,))
+    master = I2CMaster(slave, lambda req: req.write(b'\x12'))
+    assert master.read(0x40, 3) == [0x12, 0xff, 0xff]
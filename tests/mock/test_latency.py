@@ -0,0 +1,63 @@
+import pytest
+from smbusslave import SMBusSlave, Latency
+
+
+@pytest.mark.parametrize('us, bucket', [(0, 0), (50, 0), (51, 1), (100, 1), (101, 2), (25000, 8), (25001, 9), (10 ** 6, 9)])
+def test_bucket(us, bucket):
+    assert Latency(1)._bucket(us) == bucket
+
+
+def test_custom_buckets():
+    latency = Latency(1, buckets=(10, 20))
+    assert [latency._bucket(us) for us in (10, 11, 20, 21)] == [0, 1, 1, 2]
+    assert latency.register(0) == [0, 0, 0]
+
+
+# The timestamps are in nanoseconds, the buckets in microseconds
+def test_add():
+    latency = Latency(4)
+    latency.add(SMBusSlave.SMBUS_WORD, 2, 0, 40000, 90000, 300000)
+    latency.add(SMBusSlave.SMBUS_WORD, 2, 0, 40000, 90000, 30000000)
+    assert latency.protocol(SMBusSlave.SMBUS_WORD, Latency.DECODE) == [2, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert latency.protocol(SMBusSlave.SMBUS_WORD, Latency.FIRST) == [0, 2, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert latency.protocol(SMBusSlave.SMBUS_WORD) == [0, 0, 0, 1, 0, 0, 0, 0, 0, 1]
+    assert latency.register(2) == [0, 0, 0, 1, 0, 0, 0, 0, 0, 1]
+    assert latency.max(2) == 30000
+    assert sum(latency.protocol(SMBusSlave.SMBUS_BYTE)) == 0
+
+
+# Registers outside the table only count per protocol
+def test_add_unknown_reg():
+    latency = Latency(2)
+    latency.add(SMBusSlave.SMBUS_BYTE, 5, 0, 1000, 2000, 3000)
+    assert sum(latency.protocol(SMBusSlave.SMBUS_BYTE)) == 1
+
+
+def test_reset():
+    latency = Latency(2)
+    latency.add(SMBusSlave.SMBUS_BYTE, 1, 0, 1000, 2000, 3000000)
+    latency.reset()
+    for stage in (Latency.DECODE, Latency.FIRST, Latency.TOTAL):
+        assert sum(latency.protocol(SMBusSlave.SMBUS_BYTE, stage)) == 0
+    assert sum(latency.register(1)) == 0
+    assert latency.max(1) == 0
+
+
+def test_timed(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE)
+    bus.write_byte_data(address, 1, 0x12)
+    assert slave._timedreq is None
+
+    slave.latency = Latency(slave.max_reg + 1)
+    bus.write_byte_data(address, 3, 0x34)
+    assert bus.read_byte_data(address, 3) == 0x34
+    # The write and the restart read are timed separately
+    assert sum(slave.latency.protocol(SMBusSlave.SMBUS_BYTE)) == 3
+    assert sum(slave.latency.register(3)) == 3
+    assert slave._timedreq.req is None  # Doesn't keep the request alive
+
+    latency = slave.latency
+    slave.latency = None
+    bus.write_byte_data(address, 3, 0x56)
+    assert bus.read_byte_data(address, 3) == 0x56
+    assert sum(latency.protocol(SMBusSlave.SMBUS_BYTE)) == 3
@@ -0,0 +1,85 @@
+import pytest
+import digitalio
+import tracer
+from i2cslavemock import I2CSlave, I2CMaster
+from mcp23008slave import MCP23008Slave, Pin, IODIR, IOCON, GPPU, INTF, GPIO, OLAT, IOCON_SEQOP
+
+address = 0x20
+
+
+@pytest.fixture
+def mcp23008():
+    mcp = MCP23008Slave(['D0', 'D1', 'D2'])
+    return mcp, I2CMaster(I2CSlave(None, None, (address,)), mcp.process)
+
+
+def test_reset(mcp23008):
+    mcp, bus = mcp23008
+    assert bus.read_byte_data(address, IODIR) == 0xff
+    assert bus.read_byte_data(address, OLAT) == 0x00
+
+
+def test_output(mcp23008):
+    mcp, bus = mcp23008
+    bus.write_byte_data(address, IODIR, 0xfc)
+    bus.write_byte_data(address, GPIO, 0x02)
+    io0, io1 = mcp.pins[0].io, mcp.pins[1].io
+    assert io0.direction == digitalio.Direction.OUTPUT
+    assert (io0.value, io1.value) == (False, True)
+    assert bus.read_byte_data(address, OLAT) == 0x02
+    assert bus.read_byte_data(address, GPIO) & 0x03 == 0x02
+
+
+def test_input_pull(mcp23008):
+    mcp, bus = mcp23008
+    bus.write_byte_data(address, GPPU, 0x04)
+    assert mcp.pins[2].io.pull == digitalio.Pull.UP
+    assert bus.read_byte_data(address, GPIO) & 0x07 == 0x04
+
+
+# The Linux driver writes IODIR..OLAT in one go on probe
+def test_write_seq(mcp23008):
+    mcp, bus = mcp23008
+    bus.write_i2c_block_data(address, IODIR, [0xfe, 0x00, 0x00])
+    assert mcp.pins[0].io.direction == digitalio.Direction.OUTPUT
+    assert bus.read_i2c_block_data(address, IODIR, 3) == [0xfe, 0x00, 0x00]
+
+
+# All pins are reconfigured in one go when the master is done writing
+def test_commit():
+    class MCP23008(MCP23008Slave):
+        def setpinmode(self, changed):
+            calls.append(changed)
+            super().setpinmode(changed)
+
+    calls = []
+    mcp = MCP23008(['D0', 'D1', 'D2'])
+    bus = I2CMaster(I2CSlave(None, None, (address,)), mcp.process)
+    bus.write_i2c_block_data(address, IODIR, [0xf8, 0x00, 0x00, 0x00, 0x00, 0x00, 0x07])
+    assert calls == [0x07]
+    assert [mcp.pins[i].io.direction for i in range(3)] == [digitalio.Direction.OUTPUT] * 3
+
+
+def test_seqop(mcp23008):
+    mcp, bus = mcp23008
+    bus.write_byte_data(address, IOCON, IOCON_SEQOP)
+    bus.write_i2c_block_data(address, GPPU, [0x01, 0x03])
+    assert bus.read_i2c_block_data(address, GPPU, 2) == [0x03, 0x03]
+    assert bus.read_byte_data(address, INTF) == 0x00
+    bus.write_byte_data(address, IOCON, 0)
+    assert bus.read_i2c_block_data(address, IODIR, 2) == [0xff, 0x00]
+
+
+# Pin activity goes to the tracer, nothing is printed inside the transaction
+def test_pin_tracer(mcp23008, capsys, monkeypatch):
+    mcp, bus = mcp23008
+    t = tracer.Tracer()
+    monkeypatch.setattr(Pin, 'tracer', t)
+    bus.write_byte_data(address, IODIR, 0xfe)
+    bus.write_byte_data(address, GPIO, 0x01)
+    bus.read_byte_data(address, GPIO)
+    events = [(e[0], e[1], e[2]) for e in t.entries()]
+    assert events[0] == (tracer.PIN_OUTPUT, 0, 0)
+    assert (tracer.PIN_SET, 0, 1) in events
+    assert (tracer.PIN_GET, 1, 0) in events
+    assert capsys.readouterr().out == ''
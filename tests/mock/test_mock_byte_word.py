@@ -0,0 +1,146 @@
+import errno
+import pytest
+from smbusslave import SMBusSlave
+from tracer import Tracer
+
+
+@pytest.fixture(params=[SMBusSlave.SMBUS_BYTE, SMBusSlave.SMBUS_BYTE_SEQ], ids=['BYTE', 'BYTE_SEQ'])
+def byte_bus(request, smbus):
+    return smbus(request.param)
+
+
+@pytest.fixture(params=[SMBusSlave.SMBUS_WORD, SMBusSlave.SMBUS_WORD_SEQ], ids=['WORD', 'WORD_SEQ'])
+def word_bus(request, smbus):
+    return smbus(request.param)
+
+
+@pytest.mark.parametrize('reg, val', [(0x00, 0x12), (0x05, 0x56), (0x07, 0xfe)])
+def test_byte_write(byte_bus, address, reg, val):
+    slave, bus = byte_bus
+    bus.write_byte_data(address, reg, val)
+    assert bus.read_byte_data(address, reg) == val
+    assert slave.regs[reg] == val
+
+
+# Test wrap-around by using multiple starting registers
+@pytest.mark.parametrize('reg', list(range(8)))
+def test_byte_write_seq(smbus, address, reg):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE_SEQ)
+    vals = [0x11, 0x12, 0x13, 0x14, 0x15, 0x16]
+    bus.write_i2c_block_data(address, reg, vals)
+    assert bus.read_i2c_block_data(address, reg, len(vals)) == vals
+    assert slave.regs[(reg + 5) % 8] == 0x16
+
+
+@pytest.mark.parametrize('reg', [8, 9])
+def test_byte_illegal_reg(byte_bus, address, reg):
+    slave, bus = byte_bus
+    with pytest.raises(OSError) as e:
+        bus.write_byte_data(address, reg, 0)
+    assert e.value.errno == errno.EREMOTEIO
+    with pytest.raises(OSError):
+        bus.read_byte_data(address, reg)
+    # Make sure it still works after a failure
+    bus.write_byte_data(address, 1, 56)
+    assert bus.read_byte_data(address, 1) == 56
+
+
+@pytest.mark.parametrize('reg, val', [(0x01, 0x1234), (0x04, 0x789a), (0x06, 0xfedc)])
+def test_word_write(word_bus, address, reg, val):
+    slave, bus = word_bus
+    bus.write_word_data(address, reg, val)
+    assert bus.read_word_data(address, reg) == val
+    assert slave.regs[reg] == val  # Little endian
+
+
+@pytest.mark.parametrize('reg', list(range(8)))
+def test_word_write_seq(smbus, address, reg):
+    slave, bus = smbus(SMBusSlave.SMBUS_WORD_SEQ)
+    vals = [0x1102, 0x1203, 0x1304, 0x1405]
+    data = []
+    for val in vals:
+        data += [val & 0xff, val >> 8]
+    bus.write_i2c_block_data(address, reg, data)
+    assert bus.read_i2c_block_data(address, reg, len(data)) == data
+    assert [slave.regs[(reg + i) % 8] for i in range(len(vals))] == vals
+
+
+def test_tracer(byte_bus, address, capsys):
+    slave, bus = byte_bus
+    slave.tracer = Tracer()
+    bus.write_byte_data(address, 0x05, 0x56)
+    slave.tracer.dump()
+    assert '0x05=0x56' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('policy, arg, regs', [
+    (SMBusSlave.INC_LINEAR, None, [6, 7, 0, 1]),
+    (SMBusSlave.INC_GROUP, 4, [6, 7, 4, 5]),
+    (SMBusSlave.INC_NONE, None, [6, 6, 6, 6]),
+    (lambda reg: reg - 1, None, [6, 5, 4, 3]),
+], ids=['linear', 'group', 'none', 'custom'])
+def test_increment(smbus, address, policy, arg, regs):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE_SEQ, regs=range(0x10, 0x18))
+    slave.increment(policy, arg)
+    assert bus.read_i2c_block_data(address, 6, 4) == [0x10 + reg for reg in regs]
+
+
+@pytest.mark.parametrize('arg', [None, 0, -4, 2.0])
+def test_increment_bad_group(smbus, address, arg):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE_SEQ, regs=range(0x10, 0x18))
+    with pytest.raises(ValueError):
+        slave.increment(SMBusSlave.INC_GROUP, arg)
+    # The previous policy stays
+    assert bus.read_i2c_block_data(address, 7, 2) == [0x17, 0x10]
+
+
+class Commits:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commits = []
+
+    def commit(self, changed):
+        self.commits.append(bytes(changed))
+
+
+class WriteRegs:
+    def writeregs(self, start, buf):
+        for i in range(len(buf)):
+            self.regs[(start + i) % len(self.regs)] = buf[i]
+
+
+# The bitmap is sized by max_reg, a write wraps around and it's cleared after commit()
+@pytest.mark.parametrize('mixins', [(Commits,), (Commits, WriteRegs)], ids=['writereg', 'writeregs'])
+def test_commit_bitmap(smbus, address, mixins):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE_SEQ, *mixins, max_reg=63)
+    assert len(slave._changed) == 8
+    bus.write_i2c_block_data(address, 62, [1, 2, 3])
+    bus.write_byte_data(address, 9, 4)
+    assert slave.commits == [b'\x01' + bytes(6) + b'\xc0', b'\x00\x02' + bytes(6)]
+    assert slave._changed == bytes(8)
+    assert not slave._dirty
+    bus.read_byte_data(address, 9)
+    assert len(slave.commits) == 2
+
+
+class ReadRegs:
+    def readregs(self, start, count):
+        width = 2 if self.protocol == SMBusSlave.SMBUS_WORD_SEQ else 1
+        buf = bytearray()
+        for i in range(count):
+            buf += self.regs[(start + i) % len(self.regs)].to_bytes(width, 'little')
+        return buf
+
+
+# Reading past max_reg wraps around, more than once if the master wants more
+@pytest.mark.parametrize('mixins', [(), (ReadRegs,)], ids=['readreg', 'readregs'])
+def test_read_regs_wrap(smbus, address, mixins):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE_SEQ, *mixins, max_reg=3, regs=[1, 2, 3, 4])
+    assert bus.read_i2c_block_data(address, 2, 10) == [3, 4, 1, 2, 3, 4, 1, 2, 3, 4]
+    assert slave.regnr == 0
+
+
+@pytest.mark.parametrize('mixins', [(), (ReadRegs,)], ids=['readreg', 'readregs'])
+def test_read_word_regs_wrap(smbus, address, mixins):
+    slave, bus = smbus(SMBusSlave.SMBUS_WORD_SEQ, *mixins, max_reg=2, regs=[0x0201, 0x0403, 0x0605])
+    assert bus.read_i2c_block_data(address, 1, 10) == [3, 4, 5, 6, 1, 2, 3, 4, 5, 6]
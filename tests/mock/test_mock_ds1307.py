@@ -0,0 +1,99 @@
+import io
+import pytest
+import rtc
+from i2cslavemock import I2CSlave, I2CMaster
+from ds1307slave import DS1307Slave, bcd2bin, bin2bcd
+
+address = 0x68
+
+
+@pytest.fixture
+def ds1307():
+    ds = DS1307Slave(rtc.RTC(), io.BytesIO(bytes(56)))
+    return ds, I2CMaster(I2CSlave(None, None, (address,)), ds.process)
+
+
+def test_clock(ds1307):
+    ds, bus = ds1307
+    regs = bus.read_i2c_block_data(address, 0, 7)
+    assert bcd2bin(regs[0]) < 60
+    assert bcd2bin(regs[1]) < 60
+    assert bcd2bin(regs[2]) < 24
+    assert 1 <= bcd2bin(regs[3]) <= 7
+    assert 1 <= bcd2bin(regs[4]) <= 31
+    assert 1 <= bcd2bin(regs[5]) <= 12
+
+
+def test_set_clock(ds1307):
+    ds, bus = ds1307
+    date = (2017, 12, 31, 23, 59, 30)
+    vals = [date[5], date[4], date[3], 1, date[2], date[1], date[0] % 100]
+    bus.write_i2c_block_data(address, 0, [bin2bcd(val) for val in vals])
+    t = ds.rtc.datetime
+    assert (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min) == date[:5]
+    assert t.tm_sec - date[5] < 2
+
+
+def test_nvram(ds1307):
+    ds, bus = ds1307
+    data = list(range(0x10, 0x20))
+    bus.write_i2c_block_data(address, 0x30, data)
+    assert bus.read_i2c_block_data(address, 0x30, len(data)) == data
+    assert ds.ram.getvalue()[0x28:0x38] == bytes(data)
+    bus.write_byte_data(address, 0x08, 0x42)
+    assert bus.read_byte_data(address, 0x08) == 0x42
+
+
+# A dump of all 64 registers that wraps around to the time registers
+def test_dump_wrap(ds1307):
+    ds, bus = ds1307
+    bus.write_byte_data(address, 0x3f, 0x99)
+    regs = bus.read_i2c_block_data(address, 0x3f, 9)
+    assert regs[0] == 0x99
+    assert bcd2bin(regs[1]) < 60
+    assert regs[-1] == 0  # Control register
+
+
+class CountingRTC(rtc.RTC):
+    gets = 0
+    sets = 0
+
+    @property
+    def datetime(self):
+        self.gets += 1
+        return rtc.RTC.datetime.fget(self)
+
+    @datetime.setter
+    def datetime(self, t):
+        self.sets += 1
+        rtc.RTC.datetime.fset(self, t)
+
+
+# The clock is set once when the master is done writing
+@pytest.mark.parametrize('regs', [True, False], ids=['writeregs', 'writereg'])
+def test_commit(regs):
+    class DS1307(DS1307Slave):
+        writeregs = DS1307Slave.writeregs if regs else None
+
+    ds = DS1307(CountingRTC())
+    bus = I2CMaster(I2CSlave(None, None, (address,)), ds.process)
+    bus.write_i2c_block_data(address, 0, [0x30, 0x59, 0x23, 0x01, 0x31, 0x12, 0x17])
+    assert ds.rtc.sets == 1
+    t = ds.rtc.datetime
+    assert (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min) == (2017, 12, 31, 23, 59)
+
+
+# The time is read once per read transaction and not at all for RAM writes
+@pytest.mark.parametrize('regs', [True, False], ids=['readregs', 'readreg'])
+def test_snapshot(regs):
+    class DS1307(DS1307Slave):
+        readregs = DS1307Slave.readregs if regs else None
+
+    ds = DS1307(CountingRTC(), io.BytesIO(bytes(56)))
+    bus = I2CMaster(I2CSlave(None, None, (address,)), ds.process)
+    ds.rtc.gets = 0
+    bus.read_i2c_block_data(address, 0, 8)
+    assert ds.rtc.gets == 1
+    bus.write_i2c_block_data(address, 0x08, [1, 2, 3])
+    bus.write_byte_data(address, 0x10, 0x42)
+    assert ds.rtc.gets == 1
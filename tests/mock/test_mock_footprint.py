@@ -0,0 +1,53 @@
+import gc
+import io
+import tracemalloc
+import pytest
+import rtc
+from smbusslave import SMBusSlave
+from at24slave import AT24Slave
+from ds1307slave import DS1307Slave
+from ads1015slave import ADS1015Slave
+from mcp23008slave import MCP23008Slave
+
+
+class AnalogIn:
+    value = 0
+
+
+eeprom = io.BytesIO(bytes(128))
+
+
+def footprint(func, num=10):
+    """Return the average number of bytes kept alive by an object made by func"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        objs = [func() for _ in range(num)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename')) // num
+
+
+# CPython bytes per device, roughly 1.5x what was measured. This only catches
+# regressions in what the models keep alive under CPython, it says nothing
+# about the heap used on a board.
+@pytest.mark.parametrize('func, budget', [
+    (lambda: SMBusSlave(), 2000),
+    (lambda: AT24Slave(eeprom), 550),
+    (lambda: DS1307Slave(rtc.RTC()), 5500),
+    (lambda: ADS1015Slave([AnalogIn()]), 4000),
+    (lambda: MCP23008Slave(['D%d' % (i,) for i in range(8)]), 8000),
+], ids=['SMBusSlave', 'AT24Slave', 'DS1307Slave', 'ADS1015Slave', 'MCP23008Slave'])
+def test_budget(func, budget):
+    assert footprint(func) <= budget
+
+
+# CPython only, CircuitPython ignores __slots__
+def test_no_instance_dict():
+    for obj in (SMBusSlave(), AT24Slave(io.BytesIO(b'\x00')), DS1307Slave(rtc.RTC()),
+                ADS1015Slave([AnalogIn()]), MCP23008Slave(['D0'])):
+        assert not hasattr(obj, '__dict__')
+    assert not hasattr(MCP23008Slave(['D0']).pins[0], '__dict__')
+    assert not hasattr(MCP23008Slave(['D0']).pins[1].io, '__dict__')
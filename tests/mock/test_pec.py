@@ -0,0 +1,77 @@
+import errno
+import pytest
+from smbusslave import SMBusSlave, crc8
+
+# The PEC covers every byte on the bus including the address bytes, the
+# vectors are for the address fixture 0x41: 0x82 write, 0x83 read.
+# They were calculated with a bitwise CRC-8 (x^8 + x^2 + x + 1).
+
+
+def test_check_value():
+    assert crc8(0, b'123456789') == 0xf4
+
+
+def test_byte(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE, pec=True)
+    bus.write(address, [0x01, 0x55, 0x64])
+    assert slave.regs[1] == 0x55
+    assert bus.write_read(address, [0x01], 2) == [0x55, 0x53]
+    assert slave.pec_errors == 0
+
+
+def test_word(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_WORD, pec=True)
+    bus.write(address, [0x02, 0x34, 0x12, 0x18])
+    assert slave.regs[2] == 0x1234
+    assert bus.write_read(address, [0x02], 3) == [0x34, 0x12, 0x1a]
+    assert slave.pec_errors == 0
+
+
+def test_block(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_BLOCK, pec=True)
+    bus.write(address, [0x03, 0x03, 0x11, 0x22, 0x33, 0xf6])
+    assert slave.blocks[3] == b'\x11\x22\x33'
+    assert bus.write_read(address, [0x03], 5) == [0x03, 0x11, 0x22, 0x33, 0x97]
+    assert slave.pec_errors == 0
+
+
+def test_process_call(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_PROCESS_CALL, pec=True)
+    assert bus.write_read(address, [0x04, 0x34, 0x12], 3) == [0xcb, 0xed, 0x44]
+    assert slave.calls == [(0x04, 0x1234)]
+
+
+def test_block_process_call(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_BLOCK_PROC_CALL, pec=True)
+    slave.blocks[5] = b'\x33\x22\x11'
+
+    def writeblock(reg, buf):
+        slave.written = bytes(buf)
+    slave.writeblock = writeblock
+
+    data = bus.write_read(address, [0x05, 0x02, 0x11, 0x22], 5)
+    assert data == [0x03, 0x33, 0x22, 0x11, 0x21]
+    assert slave.written == b'\x11\x22'
+
+
+@pytest.mark.parametrize('protocol, data', [
+    (SMBusSlave.SMBUS_BYTE, [0x01, 0x55, 0x65]),
+    (SMBusSlave.SMBUS_WORD, [0x02, 0x34, 0x12, 0x19]),
+    (SMBusSlave.SMBUS_BLOCK, [0x03, 0x03, 0x11, 0x22, 0x33, 0xf7]),
+], ids=['BYTE', 'WORD', 'BLOCK'])
+def test_bad_pec(smbus, address, protocol, data):
+    slave, bus = smbus(protocol, pec=True)
+    with pytest.raises(OSError) as excinfo:
+        bus.write(address, data)
+    assert excinfo.value.errno == errno.EREMOTEIO
+    assert slave.pec_errors == 1
+    assert slave.regs[data[0]] == 0
+    assert slave.blocks[data[0]] == b'\x00'
+
+
+# The master didn't send a PEC byte
+def test_missing_pec(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_BYTE, pec=True)
+    bus.write(address, [0x01, 0x55])
+    assert slave.pec_errors == 1
+    assert slave.regs[1] == 0
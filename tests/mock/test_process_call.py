@@ -0,0 +1,50 @@
+import errno
+import pytest
+from smbusslave import SMBusSlave
+
+# Block process call: the response is the data reversed
+class Reverse:
+    def readblock(self, reg):
+        return self.blocks[reg][::-1]
+
+
+@pytest.mark.parametrize('reg, val', [(0, 0x0000), (1, 0x1234), (7, 0xfffe)])
+def test_process_call(smbus, address, reg, val):
+    slave, bus = smbus(SMBusSlave.SMBUS_PROCESS_CALL)
+    assert bus.process_call(address, reg, val) == ~val & 0xffff
+    assert slave.calls == [(reg, val)]
+
+
+def test_process_call_repeated(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_PROCESS_CALL)
+    for val in range(0, 0x10000, 0x1111):
+        assert bus.process_call(address, 2, val) == ~val & 0xffff
+    assert len(slave.calls) == 16
+
+
+def test_process_call_illegal_reg(smbus, address):
+    slave, bus = smbus(SMBusSlave.SMBUS_PROCESS_CALL)
+    with pytest.raises(OSError) as excinfo:
+        bus.process_call(address, 8, 0x1234)
+    assert excinfo.value.errno == errno.EREMOTEIO
+    assert slave.calls == []
+
+
+# A short write part has no response, the previous one isn't sent again
+@pytest.mark.parametrize('pec', [False, True], ids=['', 'PEC'])
+def test_process_call_short_write(smbus, address, pec):
+    slave, bus = smbus(SMBusSlave.SMBUS_PROCESS_CALL, pec=pec)
+    bus.write_read(address, [1, 0x34, 0x12], 2)
+    assert bus.write_read(address, [2, 0x55], 2) == [0xff, 0xff]
+    assert slave.calls == [(1, 0x1234)]
+    # Nor is a response sent twice
+    bus.write_read(address, [1, 0x34, 0x12], 2)
+    assert bus.read(address, 2) == [0xff, 0xff]
+
+
+@pytest.mark.parametrize('data', [[0x42], [1, 2, 3], list(range(32))], ids=['1', '3', '32'])
+def test_block_process_call(smbus, address, data):
+    slave, bus = smbus(SMBusSlave.SMBUS_BLOCK_PROC_CALL, Reverse)
+    resp = bus.write_read(address, [3, len(data)] + data, 1 + len(data))
+    assert resp == [len(data)] + data[::-1]
+    assert slave.blocks[3] == bytes(data)
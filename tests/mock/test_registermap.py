@@ -0,0 +1,44 @@
+from smbusslave import Register, RegisterMap
+
+
+def test_plain():
+    regmap = RegisterMap(4, {1: Register(0x12)})
+    assert regmap._read == [None] * 4 and regmap._write == [None] * 4
+    regmap.write(3, 0x34)
+    assert regmap.read(1) == 0x12
+    assert regmap.read(3) == 0x34
+    assert regmap.regs == bytearray([0, 0x12, 0, 0x34])
+
+
+def test_hooks():
+    writes = []
+    regmap = RegisterMap(4, {
+        0: Register(0xff, rmask=0x0f),
+        1: Register(0xaa, wmask=0xf0),
+        2: Register(0x55, readonly=True),
+        3: Register(read=lambda reg: 0x42, write=lambda reg, val: writes.append((reg, val))),
+    })
+    assert [hook is not None for hook in regmap._read] == [True, False, False, True]
+    assert [hook is not None for hook in regmap._write] == [False, True, True, True]
+    assert regmap.read(0) == 0x0f
+    regmap.write(1, 0x55)
+    assert regmap.read(1) == 0x5a
+    regmap.write(2, 0)
+    assert regmap.read(2) == 0x55
+    regmap.writeregs(3, b'\x01\x02')
+    assert regmap.read(3) == 0x42
+    assert writes == [(3, 0x01)]
+    assert regmap.regs[0] == 0x02  # Wrapped around
+    assert regmap.read(0) == 0x02
+
+
+def test_width16():
+    regmap = RegisterMap(2, {0: Register(0x8000, wmask=0xfff0)}, width=16)
+    regmap.write(0, 0x1234)
+    assert regmap.read(0) == 0x1230
+
+
+def test_width16_writeregs():
+    regmap = RegisterMap(3, {2: Register(wmask=0x0fff)}, width=16)
+    regmap.writeregs(1, b'\x34\x12\x78\x56\xbc\x9a')
+    assert list(regmap.regs) == [0x9abc, 0x1234, 0x0678]
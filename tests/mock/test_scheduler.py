@@ -0,0 +1,107 @@
+import errno
+from i2crouter import I2CRouter
+from scheduler import Scheduler
+
+
+class Router:
+    def __init__(self, requests=0):
+        self.requests = requests
+        self.log = None
+
+    def poll(self):
+        if not self.requests:
+            return False
+        self.requests -= 1
+        self.log.append('request')
+        return True
+
+
+def make_scheduler(requests=0):
+    log = []
+    router = Router(requests)
+    router.log = log
+    return Scheduler(router), log
+
+
+def task(log, name):
+    return lambda: log.append(name)
+
+
+def test_round_robin():
+    scheduler, log = make_scheduler()
+    for name in 'abc':
+        scheduler.add(task(log, name))
+    for _ in range(7):
+        scheduler.step()
+    assert log == list('abcabca')
+    assert scheduler.max_slice_ns >= 0
+
+
+# Pending requests are served before the next slice
+def test_requests_first():
+    scheduler, log = make_scheduler(2)
+    scheduler.add(task(log, 'a'))
+    scheduler.step()
+    scheduler.step()
+    assert log == ['request', 'request', 'a', 'a']
+
+
+def test_no_tasks():
+    scheduler, log = make_scheduler(1)
+    scheduler.step()
+    assert log == ['request']
+
+
+def test_add_remove():
+    scheduler, log = make_scheduler()
+    a, b, c = task(log, 'a'), task(log, 'b'), task(log, 'c')
+    scheduler.add(a)
+    scheduler.add(b)
+    scheduler.step()
+    scheduler.step()
+    scheduler.add(c)
+    scheduler.step()
+    scheduler.remove(a)  # Before the current position
+    scheduler.step()
+    scheduler.step()
+    assert log == list('abcbc')
+    scheduler.remove(c)
+    scheduler.step()
+    scheduler.step()
+    assert log == list('abcbcbb')
+    assert scheduler.tasks == [b]
+
+
+def test_generator():
+    scheduler, log = make_scheduler()
+
+    def gen():
+        for i in range(2):
+            log.append('g%d' % (i,))
+            yield
+
+    g = gen()
+    scheduler.add(g)
+    scheduler.add(task(log, 'a'))
+    for _ in range(6):
+        scheduler.step()
+    # The generator is removed by the slice that hits StopIteration
+    assert log == ['g0', 'a', 'g1', 'a', 'a']
+    assert g not in scheduler.tasks
+    assert len(scheduler.tasks) == 1
+
+
+# A request that keeps failing doesn't starve the tasks
+def test_failing_bus(capsys):
+    class BrokenSlave:
+        def request(self, timeout=-1):
+            raise OSError(errno.EIO, 'Broken')
+
+    router = I2CRouter(BrokenSlave())
+    scheduler = Scheduler(router)
+    log = []
+    scheduler.add(task(log, 'a'))
+    scheduler.step()
+    scheduler.step()
+    assert log == ['a', 'a']
+    assert router.errors == 2
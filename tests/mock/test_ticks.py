@@ -0,0 +1,15 @@
+import ticks
+from ticks import ticks_us, ticks_diff
+
+
+def test_small_int():
+    t = ticks_us()
+    assert 0 <= t < 0x40000000
+
+
+def test_diff():
+    period = ticks._TICKS_PERIOD
+    assert ticks_diff(150, 100) == 50
+    assert ticks_diff(100, 150) == -50
+    assert ticks_diff(10, period - 10) == 20
+    assert ticks_diff(period - 10, 10) == -20
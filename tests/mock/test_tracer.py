@@ -0,0 +1,26 @@
+import tracer
+from tracer import Tracer
+
+
+def test_ring_buffer():
+    t = Tracer(4)
+    for reg in range(6):
+        t.record(tracer.WRITEREG, reg, reg + 0x10)
+    entries = list(t.entries())
+    assert [(e[0], e[1], e[2]) for e in entries] == [(tracer.WRITEREG, reg, reg + 0x10) for reg in range(2, 6)]
+    times = [e[3] for e in entries]
+    assert times == sorted(times)
+
+
+def test_dump(capsys):
+    t = Tracer(2)
+    t.record(tracer.PROCESS_WRITE, 0x05)
+    t.record(tracer.WRITEREG, 0x05, 0x56)
+    t.record(tracer.READREG, 0x05, 0x56)
+    t.dump()
+    out = capsys.readouterr().out
+    assert '1 events lost' in out
+    assert 'process write' not in out
+    assert '0x05=0x56' in out
+    assert '0x05==0x56' in out
+    assert list(t.entries()) == []
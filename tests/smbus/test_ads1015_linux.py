@@ -28,7 +28,7 @@ def ads1015slave_func(tout, address):
     adc0 = analogio.AnalogIn(board.A0)
     adc1 = MockAnalogIn()
     ads1015 = ads1015slave.ADS1015Slave([adc0, adc1])
-    #ads1015.debug = True
+    #ads1015.tracer = tracer.Tracer()
 
     with I2CSlave(board.SCL, board.SDA, (address,), smbus=tout) as slave:
         while True:
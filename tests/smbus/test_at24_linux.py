@@ -53,7 +53,7 @@ def  at24slave_func(address):
 
     file = BytesIO(bytearray(128))
     at24 =  at24slave.AT24Slave(file)
-    #at24.debug= True
+    #at24.tracer = tracer.Tracer()
 
     with I2CSlave(board.SCL, board.SDA, (address,), smbus=False) as slave:
         while True:
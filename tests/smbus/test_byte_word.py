@@ -12,33 +12,28 @@ def slave_func(tout, addresses, protocol):
     import board
     from i2cslave import I2CSlave
     from smbusslave import SMBusSlave
+    from tracer import Tracer
 
     class Slave(SMBusSlave):
         def __init__(self, prot):
             super().__init__()
-            self.print = False  # Slows down too much for the seq tests resulting in a timeout
             if prot == 0:
                 self.protocol = SMBusSlave.SMBUS_BYTE
-                self.print = True
+                self.tracer = Tracer()
             elif prot == 1:
                 self.protocol = SMBusSlave.SMBUS_BYTE_SEQ
             elif prot == 2:
                 self.protocol = SMBusSlave.SMBUS_WORD
-                self.print = True
+                self.tracer = Tracer()
             elif prot == 3:
                 self.protocol = SMBusSlave.SMBUS_WORD_SEQ
             self.max_reg = 7
             self.regs = [0] * (self.max_reg + 1)
 
         def readreg(self, reg):
-            val = self.regs[reg]
-            if self.print == True:
-                print(' 0x%02x==0x%x' % (reg, val))
-            return val
+            return self.regs[reg]
 
         def writereg(self, reg, val):
-            if self.print == True:
-                print(' 0x%02x=0x%x' % (reg, val))
             self.regs[reg] = val
 
     print('\nboard: slave_func:', ','.join(['0x%02x' % (addr,) for addr in addresses]), 'prot:', protocol)
@@ -59,6 +54,10 @@ def slave_func(tout, addresses, protocol):
                     if r.address == addresses[0]:
                         bs.process(r)
 
+                # Printing slows down too much for the seq tests resulting in a timeout
+                if bs.tracer:
+                    bs.tracer.dump()
+
             except OSError as e:
                 print('ERROR:', e)
 
@@ -20,6 +20,7 @@ def mcp23008slave_func(tout, address, pins, intpin):
     import digitalio
     import mcp23008slave
     from i2cslave import I2CSlave
+    from tracer import Tracer
 
 
     tout = False  # Needed while printing stuff for debugging
@@ -30,10 +31,8 @@ def mcp23008slave_func(tout, address, pins, intpin):
     print('mcp23008slave_func', tout, '0x%02x' % (address,), repr(pins), repr(intpin))
     mcp23008 = mcp23008slave.MCP23008Slave(pins, intpin)
 
-    mcp23008.debug2 = True
-    for pin in mcp23008.pins:
-        if pin:
-            pin.debug = True
+    mcp23008.tracer = Tracer()
+    mcp23008slave.Pin.tracer = mcp23008.tracer
 
     once = True
 
@@ -58,6 +57,7 @@ def mcp23008slave_func(tout, address, pins, intpin):
                 with r:
                     if r.address == address:
                         mcp23008.process(r)
+                mcp23008.tracer.dump()
             except OSError as e:
                 print('ERROR:', e)
 
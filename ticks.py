@@ -0,0 +1,36 @@
+# Time keeping shared by the device models
+#
+# monotonic_ns() is for the code outside the transactions, the values are long
+# ints. ticks_us() stays in small int range so it doesn't allocate, it wraps
+# around and ticks_diff() has to be used to compare two values.
+
+try:
+    from time import monotonic_ns
+except ImportError:
+    from time import monotonic
+    def monotonic_ns():
+        return int(monotonic() * 1000000000)
+
+try:
+    from time import ticks_us, ticks_diff  # MicroPython
+except ImportError:
+    try:
+        from supervisor import ticks_ms  # CircuitPython
+
+        # Millisecond resolution, 2**19 ms keeps the product a small int
+        _TICKS_PERIOD = 0x80000 * 1000
+
+        def ticks_us():
+            return (ticks_ms() & 0x7ffff) * 1000
+    except ImportError:
+        _TICKS_PERIOD = 0x20000000
+
+        def ticks_us():
+            return (monotonic_ns() // 1000) & (_TICKS_PERIOD - 1)
+
+    # Signed difference end - start, correct as long as it's less than half a period
+    def ticks_diff(end, start):
+        diff = (end - start) % _TICKS_PERIOD
+        if diff >= _TICKS_PERIOD // 2:
+            diff -= _TICKS_PERIOD
+        return diff
@@ -0,0 +1,88 @@
+from array import array
+from ticks import ticks_us
+
+# Event ids
+(PROCESS_WRITE, PROCESS_RESTART_WRITE, PROCESS_RESTART_READ, PROCESS_READ, PROCESS_NOTHING,
+ NACK, READREG, WRITEREG, READREGS, WRITEREGS, READBLOCK, WRITEBLOCK, PROCESS_CALL,
+ PEC_ERROR, WRITE, INTERRUPT, DEADLINE, PIN_OUTPUT, PIN_INPUT, PIN_GET, PIN_SET) = range(21)
+
+# dump() format for each event: (name, format with reg and val)
+FORMATS = (
+    ('process write', ' 0x%02x'),
+    ('process restart write', ''),
+    ('process restart read', ' 0x%02x'),
+    ('process read', ' 0x%02x'),
+    ('process NOTHING', ''),
+    ('nack', ' 0x%02x'),
+    ('readreg', ' 0x%02x==0x%x'),
+    ('writereg', ' 0x%02x=0x%x'),
+    ('readregs', ' 0x%02x..%d'),
+    ('writeregs', ' 0x%02x..%d'),
+    ('readblock', ' 0x%02x len=%d'),
+    ('writeblock', ' 0x%02x len=%d'),
+    ('process call', ' 0x%02x=0x%x'),
+    ('PEC error', ' 0x%02x crc=0x%02x'),
+    ('write', ' 0x%x len=%d'),
+    ('interrupt', ' 0x%02x=%d'),
+    ('deadline', ' 0x%02x'),
+    ('pin output', ' %d=%d'),
+    ('pin input', ' %d pull=%d'),
+    ('pin value', ' %d==%d'),
+    ('pin value', ' %d=%d'),
+)
+
+
+# Records events in a preallocated ring buffer. Recording doesn't allocate
+# so it can stay enabled inside a transaction, dump() it afterwards.
+class Tracer:
+    def __init__(self, size=64):
+        self.size = size
+        self.event = bytearray(size)
+        self.reg = array('H', bytes(2 * size))
+        self.val = array('H', bytes(2 * size))
+        self.time = array('L', [0] * size)  # ticks_us(), wraps around
+        self.index = 0
+        self.count = 0
+
+    def record(self, event, reg=0, val=0):
+        i = self.index
+        self.event[i] = event
+        self.reg[i] = reg & 0xffff
+        self.val[i] = val & 0xffff
+        self.time[i] = ticks_us()
+        i += 1
+        if i == self.size:
+            i = 0
+        self.index = i
+        self.count += 1
+
+    # Yields (event, reg, val, time) tuples, oldest first
+    def entries(self):
+        num = min(self.count, self.size)
+        i = self.index - num
+        if i < 0:
+            i += self.size
+        for _ in range(num):
+            yield self.event[i], self.reg[i], self.val[i], self.time[i]
+            i += 1
+            if i == self.size:
+                i = 0
+
+    def clear(self):
+        self.index = 0
+        self.count = 0
+
+    def dump(self, clear=True):
+        if self.count > self.size:
+            print('%d events lost' % (self.count - self.size,))
+        for event, reg, val, t in self.entries():
+            name, fmt = FORMATS[event]
+            if fmt.count('%') == 2:
+                args = (reg, val)
+            elif fmt:
+                args = (reg,)
+            else:
+                args = ()
+            print('%10d %s%s' % (t, name, fmt % args))
+        if clear:
+            self.clear()